@@ -1,20 +1,25 @@
+import argparse
 import pygame
 import os
 
+from src.Assets import AssetStore
 from src.Game import Context, Play, Scene
+from src.Profiler import FrameProfiler
 from src.Scenes import TitleScene, WinScene, LoseScene
 
+parser = argparse.ArgumentParser(description="Happy Connect")
+parser.add_argument("--rows", type=int, default=8)
+parser.add_argument("--columns", type=int, default=8)
+parser.add_argument("--profile", help="write per-frame timings to this .csv or .json file on exit")
+arguments = parser.parse_args()
+
 pygame.init()
 
 screen = pygame.display.set_mode((400, 650))
 pygame.display.set_caption("Happy Connect")
 
 this_path = os.path.dirname(os.path.realpath(__file__))
-filenames = ["icon1.png", "icon2.png", "icon3.png", "icon4.png", "icon5.png", "icon6.png"]
-icon_list = [pygame.image.load(os.path.join(this_path, "assets", filename)).convert_alpha()
-             for filename in filenames]
-board_image = pygame.image.load(os.path.join(this_path, "assets", "board.png"))
-play_image = pygame.image.load(os.path.join(this_path, "assets", "play.png"))
+assets = AssetStore(os.path.join(this_path, "assets"))
 
 scenes = []
 
@@ -37,8 +42,9 @@ def on_lose(*args):
 
 
 play = Play(target, 40, on_win, on_lose)
-assets = dict(icon_list=icon_list, board_image=board_image, play_image=play_image)
-data = dict(play=play, scenes=scenes)
+# Always timed, so F3 can show the overlay in any session
+profiler = FrameProfiler(record_frames=arguments.profile is not None)
+data = dict(play=play, scenes=scenes, board_shape=(arguments.rows, arguments.columns), profiler=profiler)
 context = Context(screen, assets, data)
 
 add_scene(TitleScene(context))
@@ -47,5 +53,10 @@ while len(scenes) > 0:
     scene = scenes.pop()
     scene.mainloop()
 
+if "move_log" in data:
+    data["move_log"].save(os.path.join(this_path, "last_session.hclog"))
+if arguments.profile is not None:
+    profiler.save(arguments.profile)
+
 pygame.quit()
 raise SystemExit
@@ -0,0 +1,125 @@
+import json
+import os
+import struct
+from collections.abc import Mapping
+from typing import Dict, List
+
+import numpy
+import pygame
+from pygame import Surface
+
+
+ASSET_MANIFEST = dict(icon_list=["icon1.png", "icon2.png", "icon3.png", "icon4.png", "icon5.png", "icon6.png"],
+                      board_image="board.png",
+                      play_image="play.png")
+
+CACHE_MAGIC = b"HCAC"
+CACHE_VERSION = 1
+HEADER_FORMAT = "<4sII"
+
+
+def get_file_names(manifest: Dict) -> List[str]:
+    names = []
+    for value in manifest.values():
+        names.extend(value if isinstance(value, list) else [value])
+    return names
+
+
+def get_source_stamps(asset_path: str, file_names: List[str]) -> Dict:
+    stamps = {}
+    for file_name in file_names:
+        stat = os.stat(os.path.join(asset_path, file_name))
+        stamps[file_name] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+def build_cache(asset_path: str, cache_path: str, manifest: Dict = ASSET_MANIFEST):
+    # Decode every PNG once and store raw RGBA rows, so later launches skip PNG decoding entirely
+    file_names = get_file_names(manifest)
+    entries = {}
+    buffers = []
+    offset = 0
+    for file_name in file_names:
+        image = pygame.image.load(os.path.join(asset_path, file_name))
+        pixels = pygame.image.tostring(image, "RGBA")
+        entries[file_name] = dict(size=list(image.get_size()), offset=offset, length=len(pixels))
+        buffers.append(pixels)
+        offset += len(pixels)
+    index = json.dumps(dict(sources=get_source_stamps(asset_path, file_names), entries=entries)).encode("utf-8")
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temporary_path = cache_path + ".tmp"
+    with open(temporary_path, "wb") as cache_file:
+        cache_file.write(struct.pack(HEADER_FORMAT, CACHE_MAGIC, CACHE_VERSION, len(index)))
+        cache_file.write(index)
+        for pixels in buffers:
+            cache_file.write(pixels)
+    os.replace(temporary_path, cache_path)
+
+
+def read_cache_index(cache_path: str) -> Dict:
+    with open(cache_path, "rb") as cache_file:
+        header = cache_file.read(struct.calcsize(HEADER_FORMAT))
+        if len(header) < struct.calcsize(HEADER_FORMAT):
+            return None
+        magic, version, index_length = struct.unpack(HEADER_FORMAT, header)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            return None
+        index = json.loads(cache_file.read(index_length).decode("utf-8"))
+    index["data_offset"] = struct.calcsize(HEADER_FORMAT) + index_length
+    return index
+
+
+class AssetStore(Mapping):
+    def __init__(self, asset_path: str, cache_path: str = None, manifest: Dict = ASSET_MANIFEST):
+        self.asset_path = asset_path
+        self.cache_path = cache_path or os.path.join(asset_path, "__cache__", "assets.bin")
+        self.manifest = manifest
+        self.loaded = {}
+        self.index = None
+        self.pixels = None
+
+    def open_cache(self):
+        file_names = get_file_names(self.manifest)
+        index = read_cache_index(self.cache_path) if os.path.exists(self.cache_path) else None
+        if index is None or index["sources"] != get_source_stamps(self.asset_path, file_names):
+            build_cache(self.asset_path, self.cache_path, self.manifest)
+            index = read_cache_index(self.cache_path)
+        self.index = index
+        self.pixels = numpy.memmap(self.cache_path, numpy.uint8, mode="r")
+
+    def load_image(self, file_name: str) -> Surface:
+        if self.pixels is None:
+            self.open_cache()
+        entry = self.index["entries"][file_name]
+        begin = self.index["data_offset"] + entry["offset"]
+        pixels = self.pixels[begin:begin + entry["length"]]
+        # The surface borrows the mapped pages; converting or copying gives it memory of its own
+        image = pygame.image.frombuffer(pixels, tuple(entry["size"]), "RGBA")
+        if pygame.display.get_surface() is not None:
+            return image.convert_alpha()
+        return image.copy()
+
+    def __getitem__(self, name: str):
+        # Assets are decoded on first use, so a scene only pays for what it draws
+        if name not in self.loaded:
+            value = self.manifest[name]
+            if isinstance(value, list):
+                self.loaded[name] = [self.load_image(file_name) for file_name in value]
+            else:
+                self.loaded[name] = self.load_image(value)
+        return self.loaded[name]
+
+    def __iter__(self):
+        return iter(self.manifest)
+
+    def __len__(self) -> int:
+        return len(self.manifest)
+
+
+if __name__ == "__main__":
+    this_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    asset_path = os.path.join(this_path, "assets")
+    store = AssetStore(asset_path)
+    build_cache(asset_path, store.cache_path)
+    print(f"Wrote {store.cache_path}")
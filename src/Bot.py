@@ -0,0 +1,126 @@
+import argparse
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy
+
+from src.Core import Board, PathSolver
+from src.Game import Play, apply_move
+
+
+def get_candidate_paths(board: Board, play: Play, candidate_count: int, time_budget: float) -> List[List[Tuple]]:
+    # One long path per promising component, plus a version cut to what the target still needs
+    labels, sizes = board.get_components()
+    cells = board.get_board()
+    need = [max(target - picked, 0) for target, picked in zip(play.target, play.picked_counts)]
+    movable = numpy.flatnonzero(sizes > 2)
+    kinds = numpy.zeros(len(sizes), numpy.int64)
+    kinds[labels.flat] = cells.flat
+    value = numpy.minimum(sizes[movable], numpy.array(need)[kinds[movable]])
+    order = movable[numpy.lexsort((-sizes[movable], -value))][:candidate_count]
+
+    candidates = []
+    for label in order.tolist():
+        solver = PathSolver(cells, (labels, sizes), only_labels=[label])
+        path = solver.step(time_budget / max(len(order), 1))
+        if len(path) < 3:
+            continue
+        candidates.append(path)
+        wanted = need[cells[path[0]]]
+        if 3 <= wanted < len(path):
+            candidates.append(path[:wanted])
+    return candidates
+
+
+def score_position(board: Board, target: List[int], picked: List[int], moves: int) -> float:
+    need = numpy.maximum(numpy.array(target) - numpy.array(picked), 0)
+    if not numpy.any(need):
+        return 1000.0 + moves
+    if moves < 1:
+        return -1000.0 + float(numpy.sum(numpy.minimum(picked, target)))
+    largest = numpy.array(board.get_largest_components())
+    return float(numpy.sum(numpy.minimum(picked, target)) + 0.5 * numpy.sum(numpy.minimum(largest, need)))
+
+
+def evaluate_samples(cells: bytes, shape: Tuple[int, int], kind_count: int, path: List[Tuple],
+                     target: List[int], picked: List[int], moves: int, seed: int, samples: int) -> float:
+    # Runs in a worker process; the board arrives as a compact int8 buffer
+    random = numpy.random.default_rng(seed)
+    original = numpy.frombuffer(cells, numpy.int8).reshape(shape)
+    kind = int(original[path[0]])
+    picked_after = list(picked)
+    picked_after[kind] = min(picked_after[kind] + len(path), target[kind])
+    total = 0.0
+    for _ in range(samples):
+        board = Board(shape[0], shape[1], kind_count, original.copy(), seed=random)
+        # Scored against picked_after below, so there is no Play to update
+        apply_move(board, None, path)
+        total += score_position(board, target, picked_after, moves - 1)
+    return total / samples
+
+
+class LookaheadBot:
+    def __init__(self, samples: int = 32, candidate_count: int = 8, workers: int = None,
+                 executor: Executor = None, time_budget: float = 0.01, seed: int = 0):
+        self.samples = samples
+        self.candidate_count = candidate_count
+        self.workers = workers or os.cpu_count() or 1
+        self.own_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor(max_workers=self.workers)
+        self.time_budget = time_budget
+        self.seed = seed
+        self.evaluations = 0
+
+    def __enter__(self) -> "LookaheadBot":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.own_executor:
+            self.executor.shutdown()
+
+    def choose(self, board: Board, play: Play, random: numpy.random.Generator = None) -> List[Tuple]:
+        # A Simulation policy; sampling is seeded from self.seed, so the given generator is not needed
+        candidates = get_candidate_paths(board, play, self.candidate_count, self.time_budget)
+        if len(candidates) == 1:
+            return candidates[0]
+        cells = board.get_board().astype(numpy.int8).tobytes()
+        shape = tuple(board.dimension)
+        # Spread each candidate's samples over the pool in chunks, one chunk per worker
+        chunk_count = min(self.workers, self.samples)
+        chunk_sizes = [len(chunk) for chunk in numpy.array_split(numpy.arange(self.samples), chunk_count)]
+        futures = []
+        for candidate_index, path in enumerate(candidates):
+            for chunk_index, chunk_size in enumerate(chunk_sizes):
+                seed = (self.seed + candidate_index * chunk_count + chunk_index) % (2 ** 32)
+                futures.append(self.executor.submit(evaluate_samples, cells, shape, board.block_kind_count, path,
+                                                    play.target, play.picked_counts, play.moves, seed, chunk_size))
+        self.seed += len(futures)
+        scores = numpy.array([future.result() for future in futures]).reshape(len(candidates), chunk_count)
+        scores = scores @ numpy.array(chunk_sizes) / self.samples
+        self.evaluations += len(candidates) * self.samples
+        return candidates[int(numpy.argmax(scores))]
+
+
+if __name__ == "__main__":
+    from src.Simulation import Simulation
+
+    parser = argparse.ArgumentParser(description="Play Happy Connect with the lookahead bot")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--target", type=int, nargs="+", default=[10, 10, 10, 10, 10, 10])
+    parser.add_argument("--moves", type=int, default=40)
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None)
+    arguments = parser.parse_args()
+
+    with LookaheadBot(arguments.samples, workers=arguments.workers) as bot:
+        simulation = Simulation(8, 8, arguments.target, arguments.moves, bot.choose)
+        begin = time.perf_counter()
+        report = simulation.run(arguments.games)
+        seconds = time.perf_counter() - begin
+    print(f"{report.games} games, {report.moves} moves, win rate {report.win_rate:.1%}")
+    print(f"{bot.evaluations / seconds:.0f} sampled positions/s on {bot.workers} workers")
@@ -1,155 +1,705 @@
+import time
+
 import numpy
-from random import choice, randint
-from typing import List, Tuple
+from typing import List, Optional, Tuple, Union
+
+
+def label_components(board: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    rows, cols = board.shape
+    indices = numpy.arange(rows * cols).reshape(rows, cols)
+    # Every 8-neighbour pair is covered once by the right, down, down-right and down-left shifts
+    shifts = [(slice(None), slice(None, -1), slice(None), slice(1, None)),
+              (slice(None, -1), slice(None), slice(1, None), slice(None)),
+              (slice(None, -1), slice(None, -1), slice(1, None), slice(1, None)),
+              (slice(None, -1), slice(1, None), slice(1, None), slice(None, -1))]
+    sources, destinations = [], []
+    for src_rows, src_cols, dest_rows, dest_cols in shifts:
+        same = board[src_rows, src_cols] == board[dest_rows, dest_cols]
+        sources.append(indices[src_rows, src_cols][same])
+        destinations.append(indices[dest_rows, dest_cols][same])
+    sources = numpy.concatenate(sources)
+    destinations = numpy.concatenate(destinations)
+
+    parent = numpy.arange(rows * cols)
+    while True:
+        root_sources, root_destinations = parent[sources], parent[destinations]
+        unmerged = root_sources != root_destinations
+        if not numpy.any(unmerged):
+            break
+        root_sources, root_destinations = root_sources[unmerged], root_destinations[unmerged]
+        high = numpy.maximum(root_sources, root_destinations)
+        low = numpy.minimum(root_sources, root_destinations)
+        numpy.minimum.at(parent, high, low)
+        sources, destinations = sources[unmerged], destinations[unmerged]
+        while True:
+            grandparent = parent[parent]
+            if numpy.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    roots, labels = numpy.unique(parent, return_inverse=True)
+    sizes = numpy.bincount(labels, minlength=len(roots))
+    return labels.reshape(rows, cols), sizes
+
+
+NEIGHBOUR_DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def count_same_kind_neighbours(board: numpy.ndarray) -> numpy.ndarray:
+    # Works on the last two axes, so a stack of boards is counted in one go
+    rows, cols = board.shape[-2:]
+    padded = numpy.full(board.shape[:-2] + (rows + 2, cols + 2), numpy.iinfo(numpy.int16).min, numpy.int16)
+    padded[..., 1:-1, 1:-1] = board
+    degrees = numpy.zeros(board.shape, numpy.int8)
+    for dr, dc in NEIGHBOUR_DIRECTIONS:
+        degrees += padded[..., 1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols] == board
+    return degrees
+
+
+def drop_blocks(board: numpy.ndarray, removed: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    # Works on the last two axes; removed cells leave -1 holes at the top of their column
+    removed_int = removed.astype(numpy.int32)
+    removed_below = numpy.flip(numpy.cumsum(numpy.flip(removed_int, -2), axis=-2), -2) - removed_int
+    kept = numpy.logical_not(removed)
+    destination = list(numpy.nonzero(kept))
+    destination[-2] = destination[-2] + removed_below[kept]
+    dropped = numpy.full(board.shape, -1, numpy.int8)
+    dropped[tuple(destination)] = board[kept]
+    shifts = numpy.where(kept, removed_below, 0)
+    return dropped, shifts
+
+
+def fill_blocks(board: numpy.ndarray, block_kind_count: int, random: numpy.random.Generator) -> int:
+    # Holes are filled in row-major order, one random draw per hole
+    holes = board < 0
+    hole_count = int(numpy.count_nonzero(holes))
+    new_blocks = numpy.floor(random.random(hole_count) * block_kind_count).astype(numpy.int8)
+    board[holes] = new_blocks
+    return hole_count
+
+
+DIFF_REMOVE, DIFF_SLIDE, DIFF_SPAWN = 0, 1, 2
+DIFF_DTYPE = numpy.dtype([("op", numpy.int8),
+                          ("src_row", numpy.int32), ("src_col", numpy.int32),
+                          ("dest_row", numpy.int32), ("dest_col", numpy.int32)])
+
+
+def make_diff(op: int, src_rows, src_cols, dest_rows, dest_cols) -> numpy.ndarray:
+    diff = numpy.empty(len(src_rows), DIFF_DTYPE)
+    diff["op"] = op
+    diff["src_row"], diff["src_col"] = src_rows, src_cols
+    diff["dest_row"], diff["dest_col"] = dest_rows, dest_cols
+    return diff
+
+
+def to_compact_diff(diff: List[Tuple]) -> numpy.ndarray:
+    # Reads the tuple format: (row, col, -1, -1) removes a block, a negative source row spawns one
+    values = numpy.array(diff, numpy.int32).reshape(-1, 4)
+    src_rows, src_cols, dest_rows, dest_cols = values.T
+    ops = numpy.where(numpy.logical_and(dest_rows == -1, dest_cols == -1), DIFF_REMOVE,
+                      numpy.where(numpy.logical_or(src_rows < 0, src_cols < 0), DIFF_SPAWN, DIFF_SLIDE))
+    compact = make_diff(DIFF_REMOVE, src_rows, src_cols, dest_rows, dest_cols)
+    compact["op"] = ops
+    return compact[numpy.argsort(ops, kind="stable")]
+
+
+def to_tuple_diff(compact: numpy.ndarray) -> List[Tuple]:
+    fields = ["src_row", "src_col", "dest_row", "dest_col"]
+    return list(zip(*[compact[field].tolist() for field in fields]))
+
+
+def split_diff(compact: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    # Compact diffs are grouped by op, so each group is a view
+    remove_end, slide_end = numpy.searchsorted(compact["op"], [DIFF_SLIDE, DIFF_SPAWN])
+    return compact[:remove_end], compact[remove_end:slide_end], compact[slide_end:]
+
+
+class MoveIndex:
+    # A connected group of three same-kind blocks exists exactly when some block has
+    # at least two same-kind neighbours, so move availability only needs local degrees
+    def __init__(self, board: numpy.ndarray):
+        self.board = board
+        self.degrees = numpy.zeros(board.shape, numpy.int8)
+        self.movable_count = 0
+        self.components = None
+        self.rebuild(board)
+
+    def rebuild(self, board: numpy.ndarray):
+        self.board = board
+        self.degrees = count_same_kind_neighbours(board)
+        self.movable_count = int(numpy.count_nonzero(self.degrees > 1))
+        self.components = None
+
+    def patch(self, changed: List[Tuple]):
+        rows, cols = self.board.shape
+        depths = {}
+        for row, column in changed:
+            depths[column] = max(depths.get(column, 0), row + 1)
+        for column, depth in depths.items():
+            # Changed cells are the top `depth` rows of the column; their neighbours reach one further
+            bottom, left, right = min(depth + 1, rows), max(column - 1, 0), min(column + 2, cols)
+            region_bottom, region_left, region_right = min(bottom + 1, rows), max(left - 1, 0), min(right + 1, cols)
+            region = self.board[0:region_bottom, region_left:region_right]
+            degrees = count_same_kind_neighbours(region)[0:bottom, left - region_left:right - region_left]
+            previous = self.degrees[0:bottom, left:right]
+            self.movable_count += int(numpy.count_nonzero(degrees > 1)) - int(numpy.count_nonzero(previous > 1))
+            self.degrees[0:bottom, left:right] = degrees
+        self.components = None
+
+    def is_possible_to_move(self) -> bool:
+        return self.movable_count > 0
+
+    def get_components(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        if self.components is None:
+            self.components = label_components(self.board)
+        return self.components
+
+    def get_largest_components(self, block_kind_count: int) -> List[int]:
+        labels, sizes = self.get_components()
+        kinds = numpy.zeros(len(sizes), numpy.int64)
+        kinds[labels.flat] = self.board.flat
+        largest = numpy.zeros(block_kind_count, numpy.int64)
+        numpy.maximum.at(largest, kinds, sizes)
+        return largest.tolist()
+
+
+class BoardStats:
+    # Per-kind and per-column block counts, kept up to date from what each update removes and spawns
+    def __init__(self, board: numpy.ndarray, block_kind_count: int):
+        self.board = board
+        self.block_kind_count = block_kind_count
+        self.kind_counts = numpy.zeros(block_kind_count, numpy.int64)
+        self.column_counts = numpy.zeros((board.shape[1], block_kind_count), numpy.int64)
+        self.largest = None
+        self.rebuild(board)
+
+    def get_bins(self, kinds: numpy.ndarray, columns: numpy.ndarray) -> numpy.ndarray:
+        bins = columns.astype(numpy.int64) * self.block_kind_count + kinds
+        return numpy.bincount(bins.ravel(), minlength=self.column_counts.size).reshape(self.column_counts.shape)
+
+    def rebuild(self, board: numpy.ndarray):
+        self.board = board
+        columns = numpy.broadcast_to(numpy.arange(board.shape[1]), board.shape)
+        self.column_counts = self.get_bins(board, columns)
+        self.kind_counts = self.column_counts.sum(axis=0)
+        self.largest = None
+
+    def apply(self, removed_kinds: numpy.ndarray, removed_columns: numpy.ndarray,
+              spawned_kinds: numpy.ndarray, spawned_columns: numpy.ndarray):
+        delta = self.get_bins(spawned_kinds, spawned_columns) - self.get_bins(removed_kinds, removed_columns)
+        self.column_counts += delta
+        self.kind_counts += delta.sum(axis=0)
+        self.largest = None
+
+
+class PathSolver:
+    # Anytime search for the longest valid path: 8-neighbour steps, one kind, no revisits.
+    # step() may be called repeatedly with small budgets and resumes where it stopped.
+    def __init__(self, board: numpy.ndarray, components: Tuple[numpy.ndarray, numpy.ndarray] = None,
+                 memo_limit: int = 200000, only_labels: List[int] = None, degrees: numpy.ndarray = None):
+        self.board = board
+        if components is None and only_labels is not None:
+            components = label_components(board)
+        # With components the largest are searched first; without, each component is discovered from a
+        # seed cell as the search reaches it, so no step pays for labelling the whole board
+        self.components = components
+        self.only_labels = only_labels
+        self.memo_limit = memo_limit
+        self.degrees = degrees
+        # The best path is kept as node numbers into best_cells and only turned into cells when asked for
+        self.best_cells = []
+        self.best_nodes = []
+        self.best_path = []
+        self.best_length = 0
+        self.claimed = None
+        self.local_index = None
+        self.done = False
+        self.search = self.search_components()
+
+    @property
+    def best(self) -> List[Tuple]:
+        if self.best_path is None:
+            self.best_path = [self.best_cells[node] for node in self.best_nodes]
+        return self.best_path
+
+    def set_best(self, cells: List[Tuple], path: List[int]):
+        self.best_cells, self.best_nodes, self.best_path = cells, list(path), None
+
+    def step(self, time_budget: float = 0.005) -> List[Tuple]:
+        deadline = time.perf_counter() + time_budget
+        while not self.done:
+            try:
+                next(self.search)
+            except StopIteration:
+                self.done = True
+            if time.perf_counter() >= deadline:
+                break
+        return list(self.best)
+
+    def get_seeds(self):
+        # One cell per component to search, with the component size when it is known up front
+        rows, cols = self.board.shape
+        if self.components is not None:
+            labels, sizes = self.components
+            order = numpy.argsort(-sizes, kind="stable").tolist()
+            if self.only_labels is not None:
+                order = [label for label in order if label in self.only_labels]
+            first_cells = numpy.zeros(len(sizes), numpy.int64)
+            first_cells[labels.ravel()[::-1]] = numpy.arange(labels.size - 1, -1, -1)
+            for label in order:
+                size = int(sizes[label])
+                if size < 3 or size <= self.best_length:
+                    return
+                yield divmod(int(first_cells[label]), cols)
+        else:
+            # Every component of three or more has a cell with two same-kind neighbours
+            for row in range(rows):
+                for col in numpy.flatnonzero(self.degrees[row] > 1).tolist():
+                    yield row, col
+
+    def search_components(self):
+        if self.degrees is None:
+            self.degrees = count_same_kind_neighbours(self.board)
+        self.claimed = numpy.zeros(self.board.shape, bool)
+        self.local_index = numpy.zeros(self.board.shape, numpy.int64)
+        for seed in self.get_seeds():
+            if not self.claimed[seed]:
+                yield from self.search_component(seed)
+
+    def claim(self, cells: List[Tuple], neighbours: List, cell: Tuple):
+        self.claimed[cell] = True
+        self.local_index[cell] = len(cells)
+        cells.append(cell)
+        neighbours.append(None)
+
+    def get_neighbours(self, cells: List[Tuple], neighbours: List, node: int) -> List[int]:
+        # Built per cell on first visit, so a huge component costs nothing up front;
+        # same kind and touching means same component
+        rows, cols = self.board.shape
+        row, col = cells[node]
+        kind = self.board[row, col]
+        options = [(row + dr, col + dc) for dr, dc in NEIGHBOUR_DIRECTIONS
+                   if -1 < row + dr < rows and -1 < col + dc < cols and self.board[row + dr, col + dc] == kind]
+        for cell in options:
+            if not self.claimed[cell]:
+                self.claim(cells, neighbours, cell)
+        # Visiting cells with fewer onward options first finds long paths early
+        options.sort(key=lambda cell: self.degrees[cell])
+        return [int(self.local_index[cell]) for cell in options]
+
+    def search_component(self, seed: Tuple):
+        cells, neighbours = [], []
+        self.claim(cells, neighbours, seed)
+        key_base = self.board.size
+        # Two partial paths with the same end and the same visited set have the same futures
+        expanded = set()
+        # A full memo is retired and freed a little at each yield; freeing it at once stalls for tens of ms
+        retired = set()
+        nodes = 0
+        improved = False
+        starts = [0]
+        size = None
+        while len(starts) > 0:
+            start = starts.pop()
+            path = [start]
+            mask = 1 << start
+            stack = [0]
+            while len(stack) > 0:
+                nodes += 1
+                if nodes % 16 == 0:
+                    if improved:
+                        self.set_best(cells, path)
+                        improved = False
+                    for _ in range(min(len(retired), 1024)):
+                        retired.pop()
+                    yield
+                node, option = path[-1], stack[-1]
+                if neighbours[node] is None:
+                    neighbours[node] = self.get_neighbours(cells, neighbours, node)
+                if option == len(neighbours[node]):
+                    # Leaving the longest path so far, so keep a copy of it first
+                    if improved:
+                        self.set_best(cells, path)
+                        improved = False
+                    stack.pop()
+                    path.pop()
+                    mask &= ~(1 << node)
+                    continue
+                stack[-1] = option + 1
+                following = neighbours[node][option]
+                following_mask = mask | (1 << following)
+                # One int rather than a tuple: ints are not tracked by the garbage collector
+                key = following_mask * key_base + following
+                if following_mask == mask or key in expanded or key in retired:
+                    continue
+                if len(expanded) > self.memo_limit:
+                    retired, expanded = expanded, set()
+                expanded.add(key)
+                path.append(following)
+                stack.append(0)
+                mask = following_mask
+                if len(path) > self.best_length:
+                    self.best_length = len(path)
+                    improved = True
+                    if len(path) == size:
+                        self.set_best(cells, path)
+                        return
+            if size is None:
+                # The first search reached every cell, so the component is now known in full
+                size = len(cells)
+                if size <= self.best_length:
+                    return
+                # Popped from the end, so the fewest-neighbour cells go last in the list
+                starts = sorted(range(1, size), key=lambda n: -self.degrees[cells[n]])
+
+
+def find_best_path(board: numpy.ndarray, time_budget: float = 0.005) -> List[Tuple]:
+    return PathSolver(board).step(time_budget)
+
+
+def pack_paths(paths: List[List[Tuple]]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    # Paths of any length become one (path_count, longest, 2) array padded with -1, plus their lengths
+    lengths = numpy.array([len(path) for path in paths], numpy.int64)
+    cells = numpy.full((len(paths), max(lengths.max(initial=0), 1), 2), -1, numpy.int64)
+    for index, path in enumerate(paths):
+        if len(path) > 0:
+            cells[index, :len(path)] = path
+    return cells, lengths
+
+
+def validate_paths(board: numpy.ndarray, cells: numpy.ndarray, lengths: numpy.ndarray) -> numpy.ndarray:
+    # A move is at least three cells on the board, all one kind, each a neighbour of the last, none twice
+    rows, cols = board.shape
+    path_count, longest = cells.shape[:2]
+    used = numpy.arange(longest) < lengths.reshape(-1, 1)
+    path_rows, path_cols = cells[..., 0], cells[..., 1]
+    on_board = numpy.all(numpy.logical_or(numpy.logical_not(used), numpy.logical_and.reduce(
+        [path_rows > -1, path_rows < rows, path_cols > -1, path_cols < cols])), axis=1)
+    safe_rows, safe_cols = numpy.where(used, path_rows, 0), numpy.where(used, path_cols, 0)
+    kinds = board[safe_rows.clip(0, rows - 1), safe_cols.clip(0, cols - 1)]
+    same_kind = numpy.all(numpy.logical_or(numpy.logical_not(used), kinds == kinds[:, :1]), axis=1)
+    steps = numpy.maximum(numpy.abs(numpy.diff(safe_rows, axis=1)), numpy.abs(numpy.diff(safe_cols, axis=1)))
+    adjacent = numpy.all(numpy.logical_or(numpy.logical_not(used[:, 1:]), steps == 1), axis=1)
+    # Unused slots get distinct negative keys so only repeated cells sort next to an equal key
+    keys = numpy.where(used, safe_rows * cols + safe_cols, -1 - numpy.arange(longest))
+    keys.sort(axis=1)
+    distinct = numpy.all(numpy.diff(keys, axis=1) != 0, axis=1)
+    return numpy.logical_and.reduce([lengths > 2, on_board, same_kind, adjacent, distinct])
+
+
+def is_valid_path(board: numpy.ndarray, path: List[Tuple]) -> bool:
+    return bool(validate_paths(board, *pack_paths([path]))[0])
+
+
+class PathSelection:
+    # The path being drawn, in order, plus a per-cell bitmap so crossing checks are O(1)
+    def __init__(self, board: numpy.ndarray):
+        self.board = board
+        self.cells = []
+        self.marked = numpy.zeros(board.shape, bool)
+
+    def reset(self, board: numpy.ndarray):
+        self.clear()
+        self.board = board
+        if self.marked.shape != board.shape:
+            self.marked = numpy.zeros(board.shape, bool)
+
+    def clear(self):
+        for cell in self.cells:
+            self.marked[cell] = False
+        self.cells.clear()
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __contains__(self, cell: Tuple) -> bool:
+        return self.is_on_board(cell) and bool(self.marked[cell])
+
+    def is_on_board(self, cell: Tuple) -> bool:
+        rows, cols = self.board.shape
+        return -1 < cell[0] < rows and -1 < cell[1] < cols
+
+    def start(self, cell: Tuple) -> bool:
+        self.clear()
+        if not self.is_on_board(cell):
+            return False
+        self.append(cell)
+        return True
+
+    def append(self, cell: Tuple):
+        self.cells.append(cell)
+        self.marked[cell] = True
+
+    def backtrack(self) -> Tuple:
+        cell = self.cells.pop()
+        self.marked[cell] = False
+        return cell
+
+    def can_extend(self, cell: Tuple) -> bool:
+        if len(self.cells) == 0 or not self.is_on_board(cell) or self.marked[cell]:
+            return False
+        last_row, last_col = self.cells[-1]
+        is_neighbour = abs(cell[0] - last_row) < 2 and abs(cell[1] - last_col) < 2
+        return is_neighbour and self.board[cell] == self.board[last_row, last_col]
+
+    def offer(self, cell: Tuple) -> bool:
+        # Moving back onto the previous cell undoes the last step; returns whether the path changed
+        if len(self.cells) > 1 and cell == self.cells[-2]:
+            self.backtrack()
+            return True
+        if self.can_extend(cell):
+            self.append(cell)
+            return True
+        return False
+
+    def is_valid(self) -> bool:
+        return len(self.cells) > 2
+
+
+def make_random(seed=None) -> Tuple[Optional[int], numpy.random.Generator]:
+    # An integer seed is kept so the session can be logged; a Generator is shared as it is
+    if seed is None:
+        seed = int(numpy.random.SeedSequence().generate_state(1, numpy.uint64)[0])
+    if isinstance(seed, numpy.random.Generator):
+        return None, seed
+    return int(seed), numpy.random.default_rng(int(seed))
 
 
 class Board:
-    def __init__(self, rows: int, columns: int, block_kind_count: int):
+    def __init__(self, rows: int, columns: int, block_kind_count: int, board: numpy.ndarray = None,
+                 seed: Union[int, numpy.random.Generator] = None, shuffle_if_stuck: bool = True):
         self.dimension = [rows, columns]
         self.block_count = rows * columns
         self.block_kind_count = block_kind_count
-        self.board = numpy.floor(numpy.random.rand(rows, columns) * block_kind_count).astype(numpy.int8)
-        self.count = []
-        self.count_blocks()
+        self.seed, self.random = make_random(seed)
+        if board is None:
+            board = numpy.floor(self.random.random((rows, columns)) * block_kind_count).astype(numpy.int8)
+        self.board = board
+        self.stats = None
+        self.move_index = None
 
-        if not self.is_possible_to_move():
+        # Restoring a saved board skips this, so it comes back exactly as it was, stuck or not
+        if shuffle_if_stuck and not self.is_possible_to_move():
             self.shuffle()
 
     def get_board(self) -> numpy.ndarray:
         return self.board
 
     def get_count(self) -> List[int]:
-        return self.count
+        return self.get_stats().kind_counts.tolist()
 
     def get_board_at_position(self, row: int, col: int):
         return self.board[row, col]
 
     def count_blocks(self) -> None:
-        value, count = numpy.unique(self.board, return_counts=True)
-        count_dict = dict(zip(value, count))
-        self.count = [count_dict[key] for key in count_dict.keys()]
-
-    def update(self, to_remove: List[Tuple]) -> List[Tuple]:
-        diff = []
-        to_remove_animation = [(block[0], block[1], -1, -1) for block in to_remove]
-        diff.extend(to_remove_animation)
-
-        row_count, column_count = self.dimension
-        all_rows = [r for r in range(row_count)]
-        for column in range(column_count):
-            rows_to_remove = [block[0] for block in to_remove if block[1] == column]
-            remaining_rows = all_rows.copy()
-            shift_lengths_for_animation = numpy.zeros(row_count)
-            if len(rows_to_remove) > 0:
-                for row in rows_to_remove:
-                    remaining_rows.remove(row)
-                    shift_lengths_for_animation += numpy.heaviside(row - numpy.array(all_rows), 0)
-                shift_lengths_for_animation[numpy.array(rows_to_remove)] = 0
-                new_column = numpy.ones(row_count, dtype=numpy.int8) * -1
-                new_column[len(rows_to_remove):row_count] = self.board[numpy.array(remaining_rows), column]
-                self.board[:, column] = new_column
-            to_shift_animation = [(prev_row, column, prev_row + int(shift), column)
-                                  for prev_row, shift in enumerate(shift_lengths_for_animation)
-                                  if shift > 0]
-            to_add_animation = [(r - len(rows_to_remove), column, r, column)
-                                for r, _ in enumerate(rows_to_remove)]
-            to_shift_animation.extend(to_add_animation)
-            diff.extend(to_shift_animation)
-
-        removed_count = len(to_remove)
-        new_blocks = numpy.floor(numpy.random.rand(removed_count) * self.block_kind_count)
-        new_blocks = new_blocks.astype(numpy.int8)
-        to_replace = numpy.argwhere(self.board < 0)
-        for (space, block) in zip(to_replace, new_blocks):
-            self.board[space[0], space[1]] = block
+        self.stats = BoardStats(self.board, self.block_kind_count)
 
-        self.count_blocks()
+    def get_stats(self) -> BoardStats:
+        # Like the move index, the stats follow the board array and are rebuilt when it is replaced
+        if self.stats is None or self.stats.board is not self.board:
+            self.count_blocks()
+        return self.stats
+
+    def update(self, to_remove: List[Tuple], compact: bool = False) -> Union[List[Tuple], numpy.ndarray]:
+        move_index = self.get_move_index()
+        stats = self.get_stats()
+        column_count = self.dimension[1]
+        removed_rows = numpy.array([block[0] for block in to_remove], numpy.int64)
+        removed_columns = numpy.array([block[1] for block in to_remove], numpy.int64)
+        removed = numpy.zeros(self.dimension, bool)
+        removed[removed_rows, removed_columns] = True
+        removed_kinds = self.board[removed_rows, removed_columns]
+
+        dropped, shifts = drop_blocks(self.board, removed)
+        self.board[:, :] = dropped
+        fill_blocks(self.board, self.block_kind_count, self.random)
+
+        slide_rows, slide_columns = numpy.nonzero(shifts)
+        # New blocks start above the board, stacked as high as the column lost blocks
+        removed_per_column = numpy.count_nonzero(removed, axis=0)
+        spawn_columns = numpy.repeat(numpy.arange(column_count), removed_per_column)
+        first_spawn = numpy.cumsum(removed_per_column) - removed_per_column
+        spawn_rows = numpy.arange(len(spawn_columns)) - numpy.repeat(first_spawn, removed_per_column)
+        diff = numpy.concatenate([
+            make_diff(DIFF_REMOVE, removed_rows, removed_columns, -1, -1),
+            make_diff(DIFF_SLIDE, slide_rows, slide_columns,
+                      slide_rows + shifts[slide_rows, slide_columns], slide_columns),
+            make_diff(DIFF_SPAWN, spawn_rows - removed_per_column[spawn_columns], spawn_columns,
+                      spawn_rows, spawn_columns)])
+        if not compact:
+            diff = to_tuple_diff(diff)
+
+        stats.apply(removed_kinds, removed_columns, self.board[spawn_rows, spawn_columns], spawn_columns)
+        move_index.patch(to_remove)
 
         return diff
 
+    def get_move_index(self) -> MoveIndex:
+        # The board array may be replaced wholesale (shuffle, tests, restores), so rebuild on a new array
+        if self.move_index is None or self.move_index.board is not self.board:
+            self.move_index = MoveIndex(self.board)
+        return self.move_index
+
+    def get_components(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        return self.get_move_index().get_components()
+
+    def get_largest_components(self) -> List[int]:
+        stats = self.get_stats()
+        if stats.largest is None:
+            stats.largest = self.get_move_index().get_largest_components(self.block_kind_count)
+        return stats.largest
+
     def is_possible_to_move(self) -> bool:
-        rows, cols = self.dimension
-        directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        component_numbers = numpy.ones(self.dimension) * -1
-        current_component_number = 0
-        visited = numpy.zeros([rows, cols], numpy.bool)
-
-        def visit(row: int, col: int):
-            component_numbers[row, col] = current_component_number
-            visited[row, col] = True
-
-            neighbours = [d for d in directions
-                          if -1 < row + d[0] < rows and -1 < col + d[1] < cols]
-            neighbours = [n for n in neighbours
-                          if self.board[row, col] == self.board[row + n[0], col + n[1]]]
-            for n in neighbours:
-                if not visited[row + n[0], col + n[1]]:
-                    visit(row + n[0], col + n[1])
-
-        for r in range(rows):
-            for c in range(cols):
-                if not visited[r, c]:
-                    visit(r, c)
-                    current_component_number += 1
-
-        _, count = numpy.unique(component_numbers, return_counts=True)
-        return numpy.amax(count) > 2
-
-    def shuffle(self) -> List[Tuple]:
-        diff = []
-
-        new_board = numpy.ones(self.dimension, numpy.int8) * -1
-        valid_option = [kind for kind, count in enumerate(self.count) if count > 2]
-        counts = self.count.copy()
-        new_kind = choice(valid_option)
-        new_count = numpy.min([self.dimension[0], counts[new_kind]])
-        new_count = numpy.max([randint(0, new_count - 1), 3])
+        return self.get_move_index().is_possible_to_move()
+
+    def find_hint(self, time_budget: float = 0.005) -> List[Tuple]:
+        # Only components that are already labelled are reused; labelling here would stall the caller
+        move_index = self.get_move_index()
+        return PathSolver(self.board, move_index.components, degrees=move_index.degrees).step(time_budget)
 
+    def shuffle(self, compact: bool = False) -> Union[List[Tuple], numpy.ndarray]:
         rows, cols = self.dimension
-        directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        positions = [(randint(0, rows - 1), randint(0, cols - 1))]
-        for current in range(new_count):
-            row, col = positions[-1]
-            new_board[row, col] = new_kind
-            if current < new_count - 1:
-                neighbours = [d for d in directions
-                              if -1 < row + d[0] < rows and -1 < col + d[1] < cols]
-                neighbours = [n for n in neighbours
-                              if not new_board[row + n[0], col + n[1]] == new_kind]
-                if(len(neighbours)) == 0:
-                    new_count = current + 1
+        cells = self.board.ravel()
+        counts = self.get_stats().kind_counts
+        planted = numpy.zeros(self.block_count, bool)
+        plant_destinations = numpy.zeros(0, numpy.int64)
+        plant_sources = numpy.zeros(0, numpy.int64)
+
+        valid_option = numpy.flatnonzero(counts > 2)
+        if len(valid_option) > 0:
+            # Plant one random walk of a single kind so the shuffled board has a move
+            new_kind = valid_option[self.random.integers(len(valid_option))]
+            new_count = max(int(self.random.integers(0, min(rows, counts[new_kind]))), 3)
+            row, col = int(self.random.integers(0, rows)), int(self.random.integers(0, cols))
+            walk = [row * cols + col]
+            planted[walk[0]] = True
+            while len(walk) < new_count:
+                neighbours = [(row + dr, col + dc) for dr, dc in NEIGHBOUR_DIRECTIONS
+                              if -1 < row + dr < rows and -1 < col + dc < cols and
+                              not planted[(row + dr) * cols + col + dc]]
+                if len(neighbours) == 0:
                     break
-                d = choice(neighbours)
-                next_row, next_column = row + d[0], col + d[1]
-                positions.append((next_row, next_column))
-        original_positions = numpy.argwhere(self.board == new_kind)[0:new_count]
-        original_positions = [(op[0], op[1]) for op in original_positions]
-
-        diff.extend([(op[0], op[1], np[0], np[1])
-                     for op, np in zip(original_positions, positions)])
-
-        prev_positions = [(p[0], p[1]) for p in numpy.argwhere(self.board > -1)]
-        for op in original_positions:
-            prev_positions.remove(op)
-        new_positions = [(p[0], p[1]) for p in numpy.argwhere(new_board < 0)]
-
-        indices = [i for i, _ in enumerate(prev_positions)]
-        indices.reverse()
-        indices = indices[:-1]
-        for a in indices:
-            b = randint(0, a)
-            prev_positions[a], prev_positions[b] = prev_positions[b], prev_positions[a]
-        for old_new in zip(prev_positions, new_positions):
-            src, dest = old_new
-            src_row, src_col = src
-            dest_row, dest_col = dest
-            new_board[dest_row, dest_col] = self.board[src_row, src_col]
-
-        shuffles = [(b[0], b[1], a[0], a[1]) for b, a in zip(prev_positions, new_positions)]
-        diff.extend(shuffles)
-        diff = [d for d in diff if not (d[0] == d[2] and d[1] == d[3])]
-
-        self.board = new_board
+                row, col = neighbours[self.random.integers(len(neighbours))]
+                walk.append(row * cols + col)
+                planted[walk[-1]] = True
+            plant_destinations = numpy.array(walk)
+            plant_sources = numpy.flatnonzero(cells == new_kind)[:len(walk)]
+
+        # Every other block goes to the remaining cells through one random permutation
+        is_source = numpy.ones(self.block_count, bool)
+        is_source[plant_sources] = False
+        sources = numpy.concatenate([plant_sources, self.random.permutation(numpy.flatnonzero(is_source))])
+        destinations = numpy.concatenate([plant_destinations, numpy.flatnonzero(numpy.logical_not(planted))])
+        new_board = numpy.empty(self.block_count, numpy.int8)
+        new_board[destinations] = cells[sources]
+
+        moved = sources != destinations
+        src_rows, src_cols = numpy.divmod(sources[moved], cols)
+        dest_rows, dest_cols = numpy.divmod(destinations[moved], cols)
+        diff = make_diff(DIFF_SLIDE, src_rows, src_cols, dest_rows, dest_cols)
+
+        self.board = new_board.reshape(rows, cols)
         self.count_blocks()
 
-        return diff
+        return diff if compact else to_tuple_diff(diff)
+
+
+# BoardBatch draws boards in runs of up to this many cells, starting at this many boards
+BATCH_DRAW_CELLS = 1 << 22
+BATCH_FIRST_RUN = 16
+
+
+class BoardBatch:
+    def __init__(self, board_count: int, rows: int, columns: int, block_kind_count: int,
+                 boards: numpy.ndarray = None, seed: Union[int, numpy.random.Generator] = None):
+        self.board_count = board_count
+        self.dimension = [rows, columns]
+        self.block_kind_count = block_kind_count
+        self.seed, self.random = make_random(seed)
+        if boards is None:
+            self.boards = self.draw_boards()
+        else:
+            self.boards = boards
+        self.count = numpy.zeros([board_count, block_kind_count], numpy.int64)
+        self.count_blocks()
+
+    def draw_boards(self) -> numpy.ndarray:
+        # Same draws, in the same order, as creating board_count Boards one after another from
+        # one generator: a stuck board shuffles before the next board is drawn, so the boards
+        # drawn after it are thrown away. Boards are drawn a run at a time, and a run is at most
+        # twice what was kept since the last stuck board, so the thrown away draws stay linear
+        rows, columns = self.dimension
+        boards = numpy.empty((self.board_count, rows, columns), numpy.int8)
+        run_limit = max(1, BATCH_DRAW_CELLS // (rows * columns))
+        run = min(BATCH_FIRST_RUN, run_limit)
+        index = 0
+        while index < self.board_count:
+            end = min(index + run, self.board_count)
+            state = self.random.bit_generator.state
+            drawn = numpy.floor(self.random.random((end - index, rows, columns)) * self.block_kind_count)
+            stuck = numpy.flatnonzero(numpy.logical_not(
+                numpy.any(count_same_kind_neighbours(drawn) > 1, axis=(1, 2))))
+            if len(stuck) == 0:
+                boards[index:end] = drawn
+                index = end
+                run = min(run * 2, run_limit)
+                continue
+            kept = int(stuck[0]) + 1
+            boards[index:index + kept] = drawn[:kept]
+            # Rewind and step over the kept boards only, so the shuffle draws come right after them
+            self.random.bit_generator.state = state
+            self.random.random((kept, rows, columns))
+            board = Board(rows, columns, self.block_kind_count, boards[index + kept - 1].copy(), seed=self.random)
+            boards[index + kept - 1] = board.get_board()
+            index += kept
+            run = min(max(kept * 2, BATCH_FIRST_RUN), run_limit)
+        return boards
+
+    @classmethod
+    def from_boards(cls, boards: List[Board], seed: Union[int, numpy.random.Generator] = None) -> "BoardBatch":
+        rows, columns = boards[0].dimension
+        stacked = numpy.stack([board.get_board() for board in boards]).astype(numpy.int8)
+        return cls(len(boards), rows, columns, boards[0].block_kind_count, stacked, seed)
+
+    def get_board(self, index: int) -> numpy.ndarray:
+        return self.boards[index]
+
+    def to_board(self, index: int) -> Board:
+        rows, columns = self.dimension
+        return Board(rows, columns, self.block_kind_count, self.boards[index].copy())
+
+    def get_count(self) -> numpy.ndarray:
+        return self.count
+
+    def count_blocks(self) -> None:
+        # One row per board and one column per kind, so kinds missing from a board count zero
+        kind_count = self.block_kind_count
+        offsets = numpy.arange(self.board_count).reshape(-1, 1, 1) * kind_count
+        counts = numpy.bincount((self.boards + offsets).ravel(), minlength=self.board_count * kind_count)
+        self.count = counts.reshape(self.board_count, kind_count)
+
+    def update(self, to_remove) -> None:
+        # to_remove is one path per board (an empty path leaves that board alone) or a removal mask
+        if isinstance(to_remove, numpy.ndarray):
+            removed = to_remove.astype(bool)
+        else:
+            removed = numpy.zeros(self.boards.shape, bool)
+            for index, path in enumerate(to_remove):
+                if len(path) > 0:
+                    rows, columns = zip(*path)
+                    removed[index, list(rows), list(columns)] = True
+        self.boards, _ = drop_blocks(self.boards, removed)
+        fill_blocks(self.boards, self.block_kind_count, self.random)
+        self.count_blocks()
+
+    def is_possible_to_move(self) -> numpy.ndarray:
+        degrees = count_same_kind_neighbours(self.boards)
+        return numpy.any(degrees > 1, axis=(1, 2))
+
+    def shuffle_stuck(self) -> List[int]:
+        rows, columns = self.dimension
+        stuck = numpy.flatnonzero(numpy.logical_not(self.is_possible_to_move()))
+        for index in stuck:
+            board = Board(rows, columns, self.block_kind_count, self.boards[index].copy(), seed=self.random)
+            self.boards[index] = board.get_board()
+        return stuck.tolist()
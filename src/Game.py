@@ -1,9 +1,16 @@
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from contextlib import nullcontext
 
+import numpy
 import pygame
+from pygame import Color, Surface
+from pygame.font import Font
 from pygame.locals import *
 from pygame.time import Clock
-from typing import Tuple, List, Callable
+from pygame.rect import Rect
+from typing import Tuple, List, Callable, Optional
+
+from src.Core import Board
 
 
 Context = namedtuple("Context", ["screen", "assets", "data"])
@@ -14,6 +21,9 @@ class Scene:
         self.running = True
         self.context = context
         self.clock = Clock()
+        self.idle_mode = True
+        # A FrameProfiler shared by every scene, or None to run without timing
+        self.profiler = context.data.get("profiler")
 
     def on_create(self, context: Context):
         pass
@@ -30,46 +40,134 @@ class Scene:
     def on_mouse_up(self, button: Tuple, position: Tuple):
         pass
 
+    def on_mouse_wheel(self, x: int, y: int):
+        pass
+
+    def on_key_down(self, key: int, modifiers: int):
+        pass
+
     def on_animation_begin(self, timeline_id: int):
         pass
 
     def on_animation_end(self, timeline_id: int):
         pass
 
+    def on_expose(self):
+        pass
+
+    def is_animating(self) -> bool:
+        return False
+
+    def get_next_deadline(self) -> Optional[int]:
+        # Ticks at which an idle scene wants a frame without any input, or None to wait for input only
+        return None
+
     def update(self, ticks: int):
         pass
 
-    def render(self):
+    def render(self) -> Optional[List[Rect]]:
+        # Return the screen areas that changed, or None to update the whole display
         pass
 
+    def measure(self, name: str):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.measure(name)
+
+    def handle_event(self, event: pygame.event.Event):
+        if event.type == QUIT:
+            self.running = False
+        elif event.type == MOUSEBUTTONDOWN:
+            buttons = pygame.mouse.get_pressed()
+            self.on_mouse_down(buttons, event.pos)
+        elif event.type == MOUSEMOTION:
+            self.on_mouse_move(event.pos)
+        elif event.type == MOUSEBUTTONUP:
+            buttons = pygame.mouse.get_pressed()
+            self.on_mouse_up(buttons, event.pos)
+        elif event.type == MOUSEWHEEL:
+            self.on_mouse_wheel(event.x, event.y)
+        elif event.type == KEYDOWN:
+            if event.key == K_F3 and self.profiler is not None:
+                self.profiler.overlay.toggle()
+            else:
+                self.on_key_down(event.key, event.mod)
+        elif event.type == ANIMATION_BEGIN:
+            timeline_id = event.timeline_id
+            self.on_animation_begin(timeline_id)
+        elif event.type == ANIMATION_END:
+            timeline_id = event.timeline_id
+            self.on_animation_end(timeline_id)
+        elif event.type == VIDEOEXPOSE:
+            self.on_expose()
+
+    def handle_events(self, events: List[pygame.event.Event]):
+        # Runs of motion events collapse into their last one, so a frame sees at most one move between other events
+        motion = None
+        for event in events:
+            if event.type == MOUSEMOTION:
+                motion = event
+                continue
+            if motion is not None:
+                self.handle_event(motion)
+                motion = None
+            self.handle_event(event)
+        if motion is not None:
+            self.handle_event(motion)
+
+    def wait_for_events(self) -> List[pygame.event.Event]:
+        deadline = self.get_next_deadline()
+        if deadline is None:
+            event = pygame.event.wait()
+        else:
+            event = pygame.event.wait(max(deadline - pygame.time.get_ticks(), 1))
+        events = [] if event.type == NOEVENT else [event]
+        events.extend(pygame.event.get())
+        return events
+
+    def render_frame(self) -> Optional[List[Rect]]:
+        if self.profiler is None:
+            return self.render()
+        overlay = self.profiler.overlay
+        restored_rects = overlay.restore(self.context.screen)
+        dirty_rects = self.render()
+        overlay_rects = overlay.draw(self.context.screen)
+        if dirty_rects is None:
+            return None
+        return dirty_rects + restored_rects + overlay_rects
+
     def mainloop(self):
         self.on_create(self.context)
+        needs_frame = True
         while self.running:
+            # With nothing animating, sleep in the event queue instead of spinning at 30 fps
+            if self.idle_mode and not needs_frame and not self.is_animating():
+                events = self.wait_for_events()
+            else:
+                events = pygame.event.get()
             ticks = pygame.time.get_ticks()
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    self.running = False
-                elif event.type == MOUSEBUTTONDOWN:
-                    buttons = pygame.mouse.get_pressed()
-                    position = pygame.mouse.get_pos()
-                    self.on_mouse_down(buttons, position)
-                elif event.type == MOUSEMOTION:
-                    position = pygame.mouse.get_pos()
-                    self.on_mouse_move(position)
-                elif event.type == MOUSEBUTTONUP:
-                    buttons = pygame.mouse.get_pressed()
-                    position = pygame.mouse.get_pos()
-                    self.on_mouse_up(buttons, position)
-                elif event.type == ANIMATION_BEGIN:
-                    timeline_id = event.timeline_id
-                    self.on_animation_begin(timeline_id)
-                elif event.type == ANIMATION_END:
-                    timeline_id = event.timeline_id
-                    self.on_animation_end(timeline_id)
-            self.update(ticks)
-            self.render()
-            pygame.display.update()
-            self.clock.tick(30)
+            # Time spent waiting for input above is idle, not part of any frame
+            if self.profiler is not None:
+                self.profiler.begin_frame()
+            with self.measure("events"):
+                self.handle_events(events)
+            deadline = self.get_next_deadline()
+            deadline_reached = deadline is not None and ticks >= deadline
+            if needs_frame or len(events) > 0 or deadline_reached or self.is_animating():
+                with self.measure("update"):
+                    self.update(ticks)
+                with self.measure("render"):
+                    dirty_rects = self.render_frame()
+                with self.measure("flip"):
+                    if dirty_rects is None:
+                        pygame.display.update()
+                    elif len(dirty_rects) > 0:
+                        pygame.display.update(dirty_rects)
+                with self.measure("sleep"):
+                    self.clock.tick(30)
+                if self.profiler is not None:
+                    self.profiler.end_frame(ticks)
+            needs_frame = False
         self.on_destroy()
 
 
@@ -81,40 +179,60 @@ ANIMATION_END = pygame.event.custom_type()
 
 
 class Timeline:
-    def __init__(self, timeline_id: int):
+    def __init__(self, timeline_id: int, capacity: int = 64):
         self.timeline_id = timeline_id
         self.animations = []
+        # Timing lives in flat arrays so a frame evaluates every animation in one step
+        self.delays = numpy.zeros(capacity)
+        self.durations = numpy.zeros(capacity)
+        self.finished = numpy.zeros(capacity, bool)
+        self.last_time = 0
         self.begin_tick = 0
 
     def add_animation(self, animation: Animation):
+        index = len(self.animations)
+        if index == len(self.delays):
+            self.delays = numpy.concatenate([self.delays, numpy.zeros(index)])
+            self.durations = numpy.concatenate([self.durations, numpy.zeros(index)])
+            self.finished = numpy.concatenate([self.finished, numpy.zeros(index, bool)])
+        self.delays[index] = animation.delay
+        self.durations[index] = animation.duration
+        self.finished[index] = False
         self.animations.append(animation)
+        self.last_time = max(self.last_time, animation.delay + animation.duration)
 
     def get_last_time(self) -> int:
-        animation_time = [animation.delay + animation.duration for animation in self.animations]
-        if len(animation_time) > 0:
-            return max(animation_time)
-        else:
-            return 0
+        return self.last_time
 
     def animation_begin(self, ticks: int):
         self.begin_tick = ticks
 
     def update(self, ticks: int):
         ms = ticks - self.begin_tick
-        for animation in self.animations:
-            if ms < animation.delay:
-                pass
-            elif animation.delay <= ms <= animation.delay + animation.duration:
-                progress = (ms - animation.delay) / animation.duration
-                animation.setter(animation.begin_state, animation.end_state, progress)
-            elif ms > animation.delay + animation.duration:
-                animation.setter(animation.begin_state, animation.end_state, 1.0)
-                self.animations.remove(animation)
-        if len(self.animations) == 0:
+        count = len(self.animations)
+        delays, durations, finished = self.delays[:count], self.durations[:count], self.finished[:count]
+        running = numpy.logical_and(numpy.logical_not(finished), delays <= ms)
+        elapsed = ms - delays
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            progress = numpy.where(durations > 0, elapsed / durations, 1.0)
+        progress = numpy.clip(progress, 0.0, 1.0)
+
+        indices = numpy.flatnonzero(running)
+        for index, animation_progress in zip(indices.tolist(), progress[indices].tolist()):
+            animation = self.animations[index]
+            animation.setter(animation.begin_state, animation.end_state, animation_progress)
+        finished[numpy.logical_and(running, elapsed > durations)] = True
+
+        if numpy.all(finished):
             event = pygame.event.Event(ANIMATION_END, dict(timeline_id=self.timeline_id))
             pygame.event.post(event)
+            self.clear()
             self.reset_clock()
 
+    def clear(self):
+        self.animations = []
+        self.last_time = 0
+
     def reset_clock(self):
         self.begin_tick = 0
 
@@ -139,3 +257,44 @@ class Play:
         if lost:
             self.on_lose(self.picked_counts)
         return won, lost
+
+
+def apply_move(board: Board, play: Optional[Play], path: List[Tuple]) -> Tuple[numpy.ndarray, Optional[numpy.ndarray]]:
+    # A move as MainScene plays it, without sprites: score the path, update the board, shuffle when stuck
+    if play is not None:
+        play.update(board.get_board_at_position(*path[0]), len(path))
+    diff = board.update(path, compact=True)
+    shuffle = None
+    if not board.is_possible_to_move():
+        shuffle = board.shuffle(compact=True)
+    return diff, shuffle
+
+
+class TextCache:
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+
+    def get_font(self, size: int, name: str = None) -> Font:
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = Font(name, size)
+            self.fonts[key] = font
+        return font
+
+    def render(self, text: str, size: int, colour: Color = Color(255, 255, 255), name: str = None) -> Surface:
+        key = (name, size, text, tuple(colour))
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.get_font(size, name).render(text, True, colour)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.capacity:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+
+text_cache = TextCache()
@@ -0,0 +1,171 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy
+import pygame
+from pygame import Color, Surface
+from pygame.rect import Rect
+
+from src.Game import text_cache
+
+
+PHASES = ["events", "update", "render", "flip", "sleep"]
+# Everything but the sleep is work that has to fit in the frame budget
+WORK_PHASES = ["events", "update", "render", "flip"]
+
+
+class FrameProfiler:
+    def __init__(self, window: int = 300, frame_rate: int = 30, record_frames: bool = True):
+        self.window = window
+        # Every frame's row is kept for export only when asked; otherwise just the rolling window
+        self.record_frames = record_frames
+        self.budget = 1 / frame_rate
+        # Names in first-seen order: the phases, then sprites and anything else measured
+        self.names = list(PHASES) + ["frame"]
+        self.samples = {}
+        self.frame_count = 0
+        self.overruns = 0
+        self.current = {}
+        self.frames = []
+        self.frame_begin = None
+        self.overlay = ProfilerOverlay(self)
+
+    def begin_frame(self):
+        # Anything measured before this, like a loop pass that drew nothing, is dropped
+        self.current = {}
+        self.frame_begin = time.perf_counter()
+
+    def add(self, name: str, seconds: float):
+        self.current[name] = self.current.get(name, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, name: str):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - begin)
+
+    def end_frame(self, ticks: int = None):
+        if self.frame_begin is None:
+            return
+        row = dict(self.current)
+        row["frame"] = time.perf_counter() - self.frame_begin
+        work = sum(row.get(name, 0.0) for name in WORK_PHASES)
+        if work > self.budget:
+            self.overruns += 1
+        position = self.frame_count % self.window
+        for name, seconds in row.items():
+            samples = self.samples.get(name)
+            if samples is None:
+                if name not in self.names:
+                    self.names.append(name)
+                # Frames before a name first showed up spent no time in it
+                samples = numpy.zeros(self.window)
+                self.samples[name] = samples
+            samples[position] = seconds
+        # Names missing from this frame took no time in it
+        for name, samples in self.samples.items():
+            if name not in row:
+                samples[position] = 0.0
+        row["index"] = self.frame_count
+        row["ticks"] = pygame.time.get_ticks() if ticks is None else ticks
+        if self.record_frames:
+            self.frames.append(row)
+        self.frame_count += 1
+        self.frame_begin = None
+
+    def get_names(self) -> List[str]:
+        return [name for name in self.names if name != "frame"] + ["frame"]
+
+    def get_percentiles(self, name: str, percents: List[float] = (50, 90, 99)) -> List[float]:
+        # Over the last window frames only, so an old spike ages out
+        samples = self.samples.get(name)
+        if samples is None:
+            return [0.0] * len(percents)
+        return numpy.percentile(samples[:min(self.frame_count, self.window)], percents).tolist()
+
+    def get_summary(self) -> Dict:
+        summary = {}
+        for name in self.get_names():
+            samples = self.samples.get(name)
+            if samples is None:
+                continue
+            samples = samples[:min(self.frame_count, self.window)]
+            p50, p90, p99 = self.get_percentiles(name)
+            summary[name] = dict(mean=float(numpy.mean(samples)), p50=p50, p90=p90, p99=p99,
+                                 max=float(numpy.max(samples)))
+        return dict(frames=self.frame_count, overruns=self.overruns, budget=self.budget, timings=summary)
+
+    def save_csv(self, file_path: str):
+        columns = ["index", "ticks"] + self.get_names()
+        with open(file_path, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, columns, restval=0.0)
+            writer.writeheader()
+            writer.writerows(self.frames)
+
+    def save_json(self, file_path: str):
+        with open(file_path, "w") as json_file:
+            json.dump(dict(summary=self.get_summary(), frames=self.frames), json_file)
+
+    def save(self, file_path: str):
+        if file_path.endswith(".csv"):
+            self.save_csv(file_path)
+        else:
+            self.save_json(file_path)
+
+
+class ProfilerOverlay:
+    def __init__(self, profiler: FrameProfiler, position: tuple = (0, 0), refresh_interval: int = 10):
+        self.profiler = profiler
+        self.position = position
+        self.refresh_interval = refresh_interval
+        self.visible = False
+        self.image = None
+        self.rect = None
+        # The scene pixels under the overlay, put back before the scene draws so its dirty rects stay true
+        self.under = None
+        self.drawn_frame = 0
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def make_image(self) -> Surface:
+        lines = [f"{'':8}{'p50':>6}{'p90':>6}{'p99':>6}"]
+        for name in self.profiler.get_names():
+            p50, p90, p99 = (seconds * 1000 for seconds in self.profiler.get_percentiles(name))
+            lines.append(f"{name[:8]:8}{p50:6.1f}{p90:6.1f}{p99:6.1f}")
+        lines.append(f"overruns {self.profiler.overruns} / {self.profiler.frame_count}")
+        # Rendered straight from the font: these lines change too often to be worth a cache slot
+        font = text_cache.get_font(16)
+        line_surfaces = [font.render(line, True, Color(255, 255, 0)) for line in lines]
+        line_height = max(surface.get_height() for surface in line_surfaces)
+        width = max(surface.get_width() for surface in line_surfaces) + 8
+        image = Surface((width, line_height * len(lines) + 8))
+        image.fill(Color(0, 0, 0))
+        for index, surface in enumerate(line_surfaces):
+            image.blit(surface, (4, 4 + index * line_height))
+        return image
+
+    def restore(self, screen: Surface) -> List[Rect]:
+        # Called before the scene draws, so it draws over its own pixels rather than the overlay
+        if self.under is None:
+            return []
+        screen.blit(self.under, self.rect)
+        self.under = None
+        return [self.rect]
+
+    def draw(self, screen: Surface) -> List[Rect]:
+        if not self.visible:
+            return []
+        frame_count = self.profiler.frame_count
+        if self.image is None or frame_count - self.drawn_frame >= self.refresh_interval:
+            self.image = self.make_image()
+            self.drawn_frame = frame_count
+        self.rect = self.image.get_rect(topleft=self.position).clip(screen.get_rect())
+        self.under = screen.subsurface(self.rect).copy()
+        screen.blit(self.image, self.rect)
+        return [self.rect]
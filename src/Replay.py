@@ -0,0 +1,144 @@
+import argparse
+import struct
+import time
+from typing import Iterator, List, Tuple
+
+import numpy
+
+from src.Core import Board
+from src.Game import Play, apply_move
+
+
+LOG_MAGIC = b"HCML"
+LOG_VERSION = 2
+# Version 1 packed rows and columns in one byte each; it is still read
+HEADER_FORMATS = {1: "<4sBBBBHQ", 2: "<4sBHHBHQ"}
+HEADER_FORMAT = HEADER_FORMATS[LOG_VERSION]
+LENGTH_FORMAT = "<H"
+MAX_DIMENSION = 0xFFFF
+MAX_PATH_LENGTH = 0xFFFF
+
+
+def get_cell_dtype(rows: int, columns: int) -> numpy.dtype:
+    cell_count = rows * columns
+    if cell_count <= 1 << 8:
+        return numpy.dtype(numpy.uint8)
+    if cell_count <= 1 << 16:
+        return numpy.dtype("<u2")
+    if cell_count <= 1 << 32:
+        return numpy.dtype("<u4")
+    raise ValueError(f"A {rows}x{columns} board is too large for a move log")
+
+
+class MoveLog:
+    # A session is its seed plus the paths played; shuffles are not logged because the board
+    # shuffles itself from its own generator whenever it gets stuck
+    def __init__(self, rows: int, columns: int, block_kind_count: int, seed: int, target: List[int], moves: int):
+        if not 0 < rows <= MAX_DIMENSION or not 0 < columns <= MAX_DIMENSION:
+            raise ValueError(f"A {rows}x{columns} board does not fit in a move log")
+        if not 0 < block_kind_count <= 0xFF or moves > 0xFFFF or max(target) > 0xFFFF:
+            raise ValueError("Kinds, moves or targets do not fit in a move log")
+        self.dimension = [rows, columns]
+        self.block_kind_count = block_kind_count
+        self.seed = seed
+        self.target = target.copy()
+        self.moves = moves
+        self.cell_dtype = get_cell_dtype(rows, columns)
+        self.paths = []
+
+    def add_move(self, path: List[Tuple]):
+        if len(path) > MAX_PATH_LENGTH:
+            raise ValueError(f"A path of {len(path)} cells does not fit in a move log")
+        rows, columns = zip(*path)
+        cells = numpy.ravel_multi_index((rows, columns), self.dimension)
+        self.paths.append(cells.astype(self.cell_dtype))
+
+    def get_path(self, index: int) -> List[Tuple]:
+        rows, columns = numpy.unravel_index(self.paths[index], self.dimension)
+        return list(zip(rows.tolist(), columns.tolist()))
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[List[Tuple]]:
+        return (self.get_path(index) for index in range(len(self.paths)))
+
+    def to_bytes(self) -> bytes:
+        rows, columns = self.dimension
+        header = struct.pack(HEADER_FORMAT, LOG_MAGIC, LOG_VERSION, rows, columns, self.block_kind_count,
+                             self.moves, self.seed)
+        parts = [header, numpy.array(self.target, "<u2").tobytes()]
+        for cells in self.paths:
+            parts.append(struct.pack(LENGTH_FORMAT, len(cells)))
+            parts.append(cells.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MoveLog":
+        magic, version = struct.unpack_from("<4sB", data)
+        if magic != LOG_MAGIC or version not in HEADER_FORMATS:
+            raise ValueError("Not a move log")
+        header_format = HEADER_FORMATS[version]
+        _, _, rows, columns, kind_count, moves, seed = struct.unpack_from(header_format, data)
+        offset = struct.calcsize(header_format)
+        target = numpy.frombuffer(data, "<u2", kind_count, offset).tolist()
+        offset += 2 * kind_count
+        log = cls(rows, columns, kind_count, seed, target, moves)
+        length_size = struct.calcsize(LENGTH_FORMAT)
+        while offset < len(data):
+            length, = struct.unpack_from(LENGTH_FORMAT, data, offset)
+            offset += length_size
+            log.paths.append(numpy.frombuffer(data, log.cell_dtype, length, offset))
+            offset += length * log.cell_dtype.itemsize
+        return log
+
+    def save(self, file_path: str):
+        with open(file_path, "wb") as log_file:
+            log_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, file_path: str) -> "MoveLog":
+        with open(file_path, "rb") as log_file:
+            return cls.from_bytes(log_file.read())
+
+
+def replay(log: MoveLog, until: int = None) -> Tuple[Board, Play]:
+    rows, columns = log.dimension
+    board = Board(rows, columns, log.block_kind_count, seed=log.seed)
+    play = Play(log.target, log.moves, lambda *args: None, lambda *args: None)
+    for cells in log.paths[:until]:
+        path = list(zip(*numpy.unravel_index(cells, log.dimension)))
+        apply_move(board, play, path)
+    return board, play
+
+
+if __name__ == "__main__":
+    from src.Simulation import greedy_path_policy
+
+    parser = argparse.ArgumentParser(description="Replay a Happy Connect move log without a display")
+    parser.add_argument("log", nargs="?", default=None)
+    parser.add_argument("--until", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--moves", type=int, default=10000)
+    arguments = parser.parse_args()
+
+    if arguments.log is not None:
+        move_log = MoveLog.load(arguments.log)
+    else:
+        # Without a log, record a long greedy session and replay that
+        random = numpy.random.default_rng(arguments.seed)
+        move_log = MoveLog(8, 8, 6, arguments.seed, [65535] * 6, 65535)
+        board = Board(8, 8, 6, seed=arguments.seed)
+        play = Play(move_log.target, move_log.moves, lambda *args: None, lambda *args: None)
+        for _ in range(arguments.moves):
+            path = greedy_path_policy(board, play, random)
+            move_log.add_move(path)
+            apply_move(board, play, path)
+
+    begin = time.perf_counter()
+    board, play = replay(move_log, arguments.until)
+    seconds = time.perf_counter() - begin
+    replayed = len(move_log.paths[:arguments.until])
+    print(board.get_board())
+    print(f"picked {play.picked_counts}, {play.moves} moves left")
+    print(f"{replayed} moves in {seconds:.3f} s, {replayed / seconds:.0f} moves/s, {len(move_log.to_bytes())} bytes")
@@ -1,19 +1,21 @@
 import pygame
 from pygame import Color
-from pygame.font import Font
+from pygame.locals import *
 from pygame.rect import Rect
-from typing import Tuple
+from typing import Tuple, List, Optional
 
-from src.Game import Scene, Context
-from src.Core import Board
+from src.Game import Scene, Context, text_cache
+from src.Core import Board, PathSelection
+from src.Replay import MoveLog
 from src.Sprites import BoardSprite, PathSprite, PlaySprite
 
 
 class MainScene(Scene):
+    TOUCH_RATIO = 0.8
+
     def __init__(self, context: Context):
         Scene.__init__(self, context)
-        self.rows = 8
-        self.columns = 8
+        self.rows, self.columns = self.context.data.get("board_shape", (8, 8))
         self.kinds_of_blocks = 6
 
         self.board = Board(self.rows, self.columns, self.kinds_of_blocks)
@@ -22,65 +24,92 @@ class MainScene(Scene):
         board_size_int = int(self.board_size.x), int(self.board_size.y)
         board_region = pygame.Surface(board_size_int)
         board_region.blit(self.context.assets["board_image"], (0, 0, 400, 400))
-        self.board_sprite = BoardSprite(self.board, board_region, context.assets["icon_list"])
+        self.board_sprite = BoardSprite(self.board, board_region, context.assets["icon_list"], min_block_size=25)
 
-        self.selected = []
+        self.selection = PathSelection(self.board.get_board())
         self.selecting = False
+        self.last_position = (0, 0)
         self.path_sprite = PathSprite(self.board_position, self.board_size,
-                                      self.board_sprite.get_block_size())
+                                      self.board_sprite.get_block_size(), self.board_sprite.viewport)
 
         play_position = pygame.Vector2(0, 50)
         self.play = self.context.data["play"]
         self.play_sprite = PlaySprite(context.data["play"], context.assets["play_image"], play_position)
         self.animation_playing = [False, False]
 
+        self.move_log = MoveLog(self.rows, self.columns, self.kinds_of_blocks, self.board.seed,
+                                self.play.target, self.play.moves)
+        self.context.data["move_log"] = self.move_log
+
     def on_create(self, context: Context):
         pass
 
     def on_mouse_down(self, button: Tuple, position: Tuple):
         if not any(self.animation_playing):
             if button[0]:
-                block = mouse_row, mouse_col = self.mouse_on_which_block(position)
-                if mouse_row > -1 and mouse_col > -1:
-                    self.selecting = True
-                    self.selected.append(block)
+                self.selection.reset(self.board.get_board())
+                self.selecting = self.selection.start(self.mouse_on_which_block(position))
+        self.last_position = position
 
     def on_mouse_move(self, position: Tuple):
         if not any(self.animation_playing):
             if self.selecting:
-                board = self.board.get_board()
-                mouse = mouse_row, mouse_col = self.mouse_on_which_block(position)
-                last_row, last_col = self.selected[-1]
-                backtrack = len(self.selected) > 1 and mouse == self.selected[-2]
-                if backtrack:
-                    self.selected.pop()
-                    return
-                on_screen = mouse_row > -1 and mouse_col > -1
-                is_neighbour = abs(mouse_row - last_row) < 2 and abs(mouse_col - last_col) < 2
-                same_colour = board[mouse_row][mouse_col] == board[last_row][last_col]
-                not_same = not (mouse_row == last_row and mouse_col == last_col)
-                no_cross = self.selected.count((mouse_row, mouse_col)) == 0
-                correct = all([on_screen, is_neighbour, same_colour, not_same, no_cross])
-                if correct:
-                    self.selected.append(mouse)
+                # A fast drag crosses several cells between two motion events, so the whole segment is walked
+                for point in self.get_drag_points(self.last_position, position):
+                    self.selection.offer(self.mouse_on_which_block(point))
+        self.last_position = position
+
+    def get_drag_points(self, begin: Tuple, end: Tuple) -> List[pygame.Vector2]:
+        # Steps shorter than the gap between two touch zones cannot skip over a zone
+        begin, end = pygame.Vector2(begin), pygame.Vector2(end)
+        block_size = self.board_sprite.get_block_size()
+        step = min(block_size.x, block_size.y) * (1 - self.TOUCH_RATIO) / 2
+        count = max(int(begin.distance_to(end) / step), 1)
+        return [begin.lerp(end, (index + 1) / count) for index in range(count)]
+
+    @property
+    def selected(self) -> List[Tuple]:
+        return self.selection.cells
 
     def on_mouse_up(self, button: Tuple, position: Tuple):
         if not any(self.animation_playing):
-            if len(self.selected) > 2:
+            if self.selection.is_valid():
                 board = self.board.get_board()
                 row, col = self.selected[0]
                 update_kind = board[row, col]
                 update_count = len(self.selected)
+                self.move_log.add_move(self.selected)
                 self.play.update(update_kind, update_count)
-                diff = self.board.update(self.selected)
+                diff = self.board.update(self.selected, compact=True)
 
                 self.board_sprite.add_animation(diff)
                 self.board_sprite.play_animation(pygame.time.get_ticks())
                 self.play_sprite.add_animation(update_kind, update_count)
                 self.play_sprite.play_animation(pygame.time.get_ticks())
-            self.selected = []
+            self.selection.clear()
             self.selecting = False
 
+    def on_mouse_wheel(self, x: int, y: int):
+        if not any(self.animation_playing) and not self.selecting:
+            if pygame.key.get_mods() & KMOD_CTRL:
+                anchor = pygame.Vector2(pygame.mouse.get_pos()) - self.board_position
+                self.board_sprite.zoom_by(y, anchor)
+            else:
+                block_size = self.board_sprite.get_block_size()
+                self.board_sprite.scroll(x * block_size.x, -y * block_size.y)
+
+    def on_key_down(self, key: int, modifiers: int):
+        if not any(self.animation_playing) and not self.selecting:
+            block_size = self.board_sprite.get_block_size()
+            steps = {K_LEFT: (-1, 0), K_RIGHT: (1, 0), K_UP: (0, -1), K_DOWN: (0, 1)}
+            if key in steps:
+                dx, dy = steps[key]
+                self.board_sprite.scroll(dx * block_size.x, dy * block_size.y)
+            elif key in (K_EQUALS, K_PLUS, K_KP_PLUS):
+                self.board_sprite.zoom_by(1, self.board_size / 2)
+            elif key in (K_MINUS, K_KP_MINUS):
+                self.board_sprite.zoom_by(-1, self.board_size / 2)
+
     def on_animation_begin(self, timeline_id: int):
         self.animation_playing[timeline_id] = True
 
@@ -93,35 +122,46 @@ class MainScene(Scene):
 
         if not any(self.animation_playing):
             if not self.board.is_possible_to_move():
-                diff = self.board.shuffle()
+                diff = self.board.shuffle(compact=True)
                 self.board_sprite.add_animation(diff)
                 self.board_sprite.play_animation(pygame.time.get_ticks())
 
+    def on_expose(self):
+        self.board_sprite.layer_dirty = True
+        self.play_sprite.rendered_counts = None
+
+    def is_animating(self) -> bool:
+        return any(self.animation_playing)
+
     def update(self, ticks: int):
         if self.animation_playing[0]:
             self.board_sprite.update(ticks)
         if self.animation_playing[1]:
             self.play_sprite.update(ticks)
 
-    def render(self):
-        self.board_sprite.render(self.context.screen, self.board_position, self.selected)
-        self.path_sprite.render(self.context.screen, self.selected)
-        self.play_sprite.render(self.context.screen, self.board_sprite.block_images)
+    def render(self) -> List[Rect]:
+        with self.measure("BoardSprite"):
+            board_rects = self.board_sprite.render(self.context.screen, self.board_position, self.selected)
+        with self.measure("PathSprite"):
+            self.path_sprite.render(self.context.screen, self.selected, board_rects)
+        with self.measure("PlaySprite"):
+            play_rects = self.play_sprite.render(self.context.screen, self.board_sprite.source_images)
+        return board_rects + play_rects
 
     def mouse_on_which_block(self, position: Tuple) -> Tuple:
-        block_size = self.board_sprite.get_block_size()
+        viewport = self.board_sprite.viewport
         mouse_position = pygame.Vector2(position)
         offset = mouse_position - self.board_position
-        column_index, column_remain = divmod(offset.x, block_size.x)
-        row_index, row_remain = divmod(offset.y, block_size.y)
-        column_index = column_index if -1 < column_index < self.columns else -1
-        row_index = row_index if -1 < row_index < self.rows else -1
-
-        row_col = int(row_index), int(column_index)
-        touch_ratio = 0.8
-        touch_low, touch_high = 0.5 - touch_ratio / 2, 0.5 + touch_ratio / 2
-        column_in_touch = touch_low < column_remain / block_size.x < touch_high
-        row_in_touch = touch_low < row_remain / block_size.y < touch_high
+        if not (0 <= offset.x < viewport.size.x and 0 <= offset.y < viewport.size.y):
+            return -1, -1
+        row_index, column_index, row_remain, column_remain = viewport.get_cell_at(offset)
+        column_index = column_index if -1 < column_index < viewport.column_count else -1
+        row_index = row_index if -1 < row_index < viewport.row_count else -1
+
+        row_col = row_index, column_index
+        touch_low, touch_high = 0.5 - self.TOUCH_RATIO / 2, 0.5 + self.TOUCH_RATIO / 2
+        column_in_touch = touch_low < column_remain < touch_high
+        row_in_touch = touch_low < row_remain < touch_high
         if column_in_touch and row_in_touch:
             return row_col
         else:
@@ -139,11 +179,11 @@ class TitleScene(Scene):
 
         self.background = self.context.assets["board_image"]
         self.background_rect = self.background.get_rect(topleft=board_position)
-        font = Font(None, 48)
-        self.title = font.render(title, True, Color(255, 255, 255))
+        self.title = text_cache.render(title, 48)
         self.title_rect = self.title.get_rect(center=title_position)
-        self.button = font.render(button_text, True, Color(255, 255, 255))
+        self.button = text_cache.render(button_text, 48)
         self.button_rect = self.button.get_rect(center=button_position)
+        self.drawn = False
 
     def on_mouse_down(self, button: Tuple, position: Tuple):
         if button[0] and self.button_rect.collidepoint(*position):
@@ -151,7 +191,14 @@ class TitleScene(Scene):
             scenes.append(MainScene(self.context))
             pygame.event.post(pygame.event.Event(pygame.QUIT, {}))
 
-    def render(self):
+    def on_expose(self):
+        self.drawn = False
+
+    def render(self) -> Optional[List[Rect]]:
+        # Nothing on these screens moves, so only the first frame needs drawing
+        if self.drawn:
+            return []
+        self.drawn = True
         screen = self.context.screen
         screen.fill(Color(0, 0, 0))
         screen.blit(self.background, self.background_rect)
@@ -170,11 +217,11 @@ class WinScene(Scene):
 
         self.background = self.context.assets["board_image"]
         self.background_rect = self.background.get_rect(topleft=board_position)
-        font = Font(None, 48)
-        self.title = font.render(title, True, Color(255, 255, 255))
+        self.title = text_cache.render(title, 48)
         self.title_rect = self.title.get_rect(center=title_position)
-        self.button = font.render(button_text, True, Color(255, 255, 255))
+        self.button = text_cache.render(button_text, 48)
         self.button_rect = self.button.get_rect(center=button_position)
+        self.drawn = False
 
     def on_mouse_down(self, button: Tuple, position: Tuple):
         if button[0] and self.button_rect.collidepoint(*position):
@@ -182,7 +229,13 @@ class WinScene(Scene):
             scenes.append(TitleScene(self.context))
             pygame.event.post(pygame.event.Event(pygame.QUIT, {}))
 
-    def render(self):
+    def on_expose(self):
+        self.drawn = False
+
+    def render(self) -> Optional[List[Rect]]:
+        if self.drawn:
+            return []
+        self.drawn = True
         screen = self.context.screen
         screen.fill(Color(0, 0, 0))
         screen.blit(self.background, self.background_rect)
@@ -201,11 +254,11 @@ class LoseScene(Scene):
 
         self.background = self.context.assets["board_image"]
         self.background_rect = self.background.get_rect(topleft=board_position)
-        font = Font(None, 48)
-        self.title = font.render(title, True, Color(255, 255, 255))
+        self.title = text_cache.render(title, 48)
         self.title_rect = self.title.get_rect(center=title_position)
-        self.button = font.render(button_text, True, Color(255, 255, 255))
+        self.button = text_cache.render(button_text, 48)
         self.button_rect = self.button.get_rect(center=button_position)
+        self.drawn = False
 
     def on_mouse_down(self, button: Tuple, position: Tuple):
         if button[0] and self.button_rect.collidepoint(*position):
@@ -213,7 +266,13 @@ class LoseScene(Scene):
             scenes.append(MainScene(self.context))
             pygame.event.post(pygame.event.Event(pygame.QUIT, {}))
 
-    def render(self):
+    def on_expose(self):
+        self.drawn = False
+
+    def render(self) -> Optional[List[Rect]]:
+        if self.drawn:
+            return []
+        self.drawn = True
         screen = self.context.screen
         screen.fill(Color(0, 0, 0))
         screen.blit(self.background, self.background_rect)
@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy
+
+from src.Core import Board, is_valid_path
+from src.Game import Play, apply_move
+from src.Simulation import short_path_policy
+
+
+# One JSON object per line in each direction. Requests carry an "id" that the reply echoes:
+#   {"id": 1, "op": "new", "rows": 8, "columns": 8, "target": [10, ...], "moves": 40, "seed": 5}
+#   {"id": 2, "op": "move", "session": 1, "path": [[0, 0], [0, 1], [1, 1]]}
+#   {"id": 3, "op": "close", "session": 1}
+#   {"id": 4, "op": "stats"}
+# A move reply carries the compact update diff as [op, src_row, src_col, dest_row, dest_col] rows,
+# the shuffle diff if the board got stuck, and the Play progress.
+
+# Lines are read whole; the shuffle diff of the largest allowed board runs to tens of MB
+STREAM_LIMIT = 1 << 26
+
+
+class LatencyHistogram:
+    # Power-of-two buckets in microseconds: bucket b counts latencies in [2^(b-1), 2^b)
+    def __init__(self, bucket_count: int = 32):
+        self.counts = numpy.zeros(bucket_count, numpy.int64)
+        self.total = 0.0
+
+    def record(self, seconds: float):
+        microseconds = max(int(seconds * 1e6), 0)
+        self.counts[min(microseconds.bit_length(), len(self.counts) - 1)] += 1
+        self.total += seconds
+
+    def get_count(self) -> int:
+        return int(self.counts.sum())
+
+    def get_percentile(self, percent: float) -> float:
+        # Upper bound of the bucket holding the percentile, in seconds
+        count = self.get_count()
+        if count == 0:
+            return 0.0
+        bucket = int(numpy.searchsorted(numpy.cumsum(self.counts), count * percent / 100))
+        return (1 << bucket) / 1e6
+
+    def to_dict(self) -> Dict:
+        count = self.get_count()
+        return dict(count=count, mean=self.total / count if count > 0 else 0.0,
+                    p50=self.get_percentile(50), p90=self.get_percentile(90), p99=self.get_percentile(99),
+                    buckets=self.counts.tolist())
+
+
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.sessions = set()
+
+    async def send(self, message: Dict):
+        self.writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        await self.writer.drain()
+
+
+class Session:
+    def __init__(self, session_id: int, board: Board, target: List[int], moves: int, connection: Connection,
+                 queue_size: int):
+        self.session_id = session_id
+        self.board = board
+        self.play = Play(target, moves, self.on_win, self.on_lose)
+        self.connection = connection
+        self.queue = asyncio.Queue(queue_size)
+        self.result = None
+        self.task = None
+
+    def on_win(self, *args):
+        self.result = True
+
+    def on_lose(self, *args):
+        self.result = False
+
+
+class GameServer:
+    def __init__(self, queue_size: int = 8, max_sessions: int = 100000):
+        self.queue_size = queue_size
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+        self.latency = LatencyHistogram()
+        self.server = None
+        self.handlers = {}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        self.server = await asyncio.start_server(self.handle_connection, host, port, limit=STREAM_LIMIT)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        for session in list(self.sessions.values()):
+            self.close_session(session)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        # Closing the transports ends each handler's read loop, so handlers finish on their own
+        for connection in self.handlers.values():
+            connection.writer.close()
+        await asyncio.gather(*self.handlers.keys(), return_exceptions=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(reader, writer)
+        handler = asyncio.current_task()
+        self.handlers[handler] = connection
+        try:
+            async for line in reader:
+                received = time.perf_counter()
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if not isinstance(request, dict):
+                    await connection.send(dict(op="error", message="Malformed request"))
+                    continue
+                await self.handle_request(connection, request, received)
+        except ConnectionError:
+            pass
+        finally:
+            for session_id in list(connection.sessions):
+                self.close_session(self.sessions[session_id])
+            writer.close()
+            self.handlers.pop(handler, None)
+
+    async def handle_request(self, connection: Connection, request: Dict, received: float):
+        op = request.get("op")
+        reply = dict(id=request.get("id"))
+        if op == "new":
+            reply.update(self.create_session(connection, request))
+        elif op == "move":
+            session = self.get_session(connection, request)
+            if session is None:
+                reply.update(op="error", message="Unknown session")
+            else:
+                try:
+                    # A session holds at most queue_size pending moves; beyond that the client is told to back off
+                    session.queue.put_nowait((request, received))
+                    return
+                except asyncio.QueueFull:
+                    reply.update(op="busy", session=session.session_id)
+        elif op == "close":
+            session = self.get_session(connection, request)
+            if session is not None:
+                self.close_session(session)
+            reply.update(op="closed", session=request.get("session"))
+        elif op == "stats":
+            reply.update(op="stats", sessions=len(self.sessions), latency=self.latency.to_dict())
+        else:
+            reply.update(op="error", message="Unknown op")
+        await connection.send(reply)
+        self.latency.record(time.perf_counter() - received)
+
+    def get_session(self, connection: Connection, request: Dict) -> Optional[Session]:
+        # Only this connection's sessions, and only by an int id; anything else is unknown
+        session_id = request.get("session")
+        if type(session_id) is not int:
+            return None
+        session = self.sessions.get(session_id)
+        if session is None or session.connection is not connection:
+            return None
+        return session
+
+    def create_session(self, connection: Connection, request: Dict) -> Dict:
+        if len(self.sessions) >= self.max_sessions:
+            return dict(op="error", message="Too many sessions")
+        try:
+            rows, columns = int(request.get("rows", 8)), int(request.get("columns", 8))
+            target = [int(count) for count in request.get("target", [10] * 6)]
+            moves = int(request.get("moves", 40))
+            seed = None if request.get("seed") is None else int(request["seed"]) % (1 << 64)
+        except (TypeError, ValueError, OverflowError):
+            return dict(op="error", message="Malformed session")
+        if not (2 < rows < 1000 and 2 < columns < 1000 and 1 < len(target) < 128 and moves > 0):
+            return dict(op="error", message="Malformed session")
+        session_id = next(self.session_ids)
+        board = Board(rows, columns, len(target), seed=seed)
+        session = Session(session_id, board, target, moves, connection, self.queue_size)
+        session.task = asyncio.ensure_future(self.run_session(session))
+        self.sessions[session_id] = session
+        connection.sessions.add(session_id)
+        return dict(op="created", session=session_id, seed=board.seed, board=board.get_board().tolist())
+
+    def close_session(self, session: Session):
+        session.task.cancel()
+        self.sessions.pop(session.session_id, None)
+        session.connection.sessions.discard(session.session_id)
+
+    async def run_session(self, session: Session):
+        # Moves of one session are applied in order; sessions interleave freely
+        while True:
+            request, received = await session.queue.get()
+            reply = dict(id=request.get("id"), session=session.session_id)
+            try:
+                reply.update(self.apply_move(session, request.get("path")))
+            except Exception as error:
+                # One bad move must not stop the worker, or every later move of the session goes unanswered
+                reply.update(op="error", message=f"Move failed: {type(error).__name__}")
+            try:
+                await session.connection.send(reply)
+            except ConnectionError:
+                return
+            self.latency.record(time.perf_counter() - received)
+
+    def apply_move(self, session: Session, path) -> Dict:
+        if session.result is not None:
+            return dict(op="error", message="Game over")
+        try:
+            path = [(int(row), int(col)) for row, col in path]
+        except (TypeError, ValueError):
+            return dict(op="error", message="Malformed path")
+        board = session.board
+        rows, columns = board.dimension
+        if not all(0 <= row < rows and 0 <= col < columns for row, col in path):
+            return dict(op="error", message="Invalid path")
+        if not is_valid_path(board.get_board(), path):
+            return dict(op="error", message="Invalid path")
+        diff, shuffle = apply_move(board, session.play, path)
+        if shuffle is not None:
+            shuffle = shuffle.tolist()
+        return dict(op="update", diff=diff.tolist(), shuffle=shuffle, picked=session.play.picked_counts,
+                    moves=session.play.moves, result=session.result)
+
+
+class LoadClient:
+    # Stands in for players: each session mirrors its board from the seed and plays short moves
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.request_ids = itertools.count(1)
+        self.pending = {}
+        self.reader = None
+        self.writer = None
+        self.listener = None
+        self.latencies = []
+        self.busy_count = 0
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+        self.listener = asyncio.ensure_future(self.listen())
+
+    async def close(self):
+        self.writer.close()
+        self.listener.cancel()
+
+    async def listen(self):
+        async for line in self.reader:
+            reply = json.loads(line)
+            future = self.pending.pop(reply.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(reply)
+
+    async def request(self, **request) -> Dict:
+        request_id = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(json.dumps(dict(request, id=request_id)).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def play_session(self, seed: int, target: List[int], moves: int, rows: int = 8, columns: int = 8) -> int:
+        created = await self.request(op="new", rows=rows, columns=columns, target=target, moves=moves, seed=seed)
+        board = Board(rows, columns, len(target), seed=created["seed"])
+        play = Play(target, moves, lambda *args: None, lambda *args: None)
+        # Separate from the board's generator, which has to stay in step with the server's copy
+        random = numpy.random.default_rng(seed)
+        played = 0
+        result = None
+        while result is None:
+            path = short_path_policy(board, play, random)
+            begin = time.perf_counter()
+            cells = [[int(row), int(col)] for row, col in path]
+            reply = await self.request(op="move", session=created["session"], path=cells)
+            self.latencies.append(time.perf_counter() - begin)
+            if reply["op"] == "busy":
+                self.busy_count += 1
+                await asyncio.sleep(0.001)
+                continue
+            if reply["op"] != "update":
+                raise RuntimeError(reply.get("message"))
+            apply_move(board, play, path)
+            played += 1
+            result = reply["result"]
+        await self.request(op="close", session=created["session"])
+        return played
+
+
+async def run_load_test(host: str, port: int, session_count: int, connection_count: int,
+                        target: List[int], moves: int, seed: int = 0) -> Dict:
+    clients = [LoadClient(host, port) for _ in range(connection_count)]
+    for client in clients:
+        await client.connect()
+    begin = time.perf_counter()
+    played = await asyncio.gather(*[clients[index % connection_count].play_session(seed + index, target, moves)
+                                    for index in range(session_count)])
+    seconds = time.perf_counter() - begin
+    stats = await clients[0].request(op="stats")
+    for client in clients:
+        await client.close()
+    latencies = numpy.array([latency for client in clients for latency in client.latencies])
+    return dict(sessions=session_count, moves=sum(played), seconds=seconds,
+                busy=sum(client.busy_count for client in clients),
+                client_p50=float(numpy.percentile(latencies, 50)), client_p99=float(numpy.percentile(latencies, 99)),
+                server=stats["latency"])
+
+
+async def serve(host: str, port: int, queue_size: int):
+    server = GameServer(queue_size)
+    host, port = await server.start(host, port)
+    print(f"Serving on {host}:{port}")
+    await server.server.serve_forever()
+
+
+async def load(arguments):
+    server = None
+    host, port = arguments.host, arguments.port
+    if port == 0:
+        # Without a port, load-test a server running in this process
+        server = GameServer(arguments.queue_size)
+        host, port = await server.start(host, 0)
+    report = await run_load_test(host, port, arguments.sessions, arguments.connections,
+                                 arguments.target, arguments.moves, arguments.seed)
+    if server is not None:
+        await server.stop()
+    print(f"{report['sessions']} sessions, {report['moves']} moves in {report['seconds']:.2f} s, "
+          f"{report['moves'] / report['seconds']:.0f} moves/s, {report['busy']} busy replies")
+    print(f"client round trip p50 {report['client_p50'] * 1e3:.2f} ms, p99 {report['client_p99'] * 1e3:.2f} ms")
+    print(f"server latency p50 <{report['server']['p50'] * 1e3:.3f} ms, p99 <{report['server']['p99'] * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host Happy Connect sessions over a local socket")
+    parser.add_argument("mode", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--target", type=int, nargs="+", default=[10, 10, 10, 10, 10, 10])
+    parser.add_argument("--moves", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    if arguments.mode == "serve":
+        asyncio.run(serve(arguments.host, arguments.port or 8765, arguments.queue_size))
+    else:
+        asyncio.run(load(arguments))
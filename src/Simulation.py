@@ -0,0 +1,140 @@
+import argparse
+import time
+from collections import namedtuple
+from typing import Callable, List, Tuple
+
+import numpy
+
+from src.Core import Board, NEIGHBOUR_DIRECTIONS
+from src.Game import Play, apply_move
+
+
+# Policies draw from the generator they are given, never from the board's, so a recorded session replays
+Policy = Callable[[Board, Play, numpy.random.Generator], List[Tuple]]
+
+
+def get_same_kind_neighbours(board: numpy.ndarray, row: int, col: int) -> List[Tuple]:
+    rows, cols = board.shape
+    return [(row + dr, col + dc) for dr, dc in NEIGHBOUR_DIRECTIONS
+            if -1 < row + dr < rows and -1 < col + dc < cols and board[row + dr, col + dc] == board[row, col]]
+
+
+def get_move_starts(board: Board, play: Play) -> numpy.ndarray:
+    # Cells with two same-kind neighbours are the middle of a valid three-block path
+    starts = numpy.argwhere(board.get_move_index().degrees > 1)
+    kinds = board.get_board()[starts[:, 0], starts[:, 1]]
+    wanted = [kind for kind, (picked, target) in enumerate(zip(play.picked_counts, play.target))
+              if picked < target]
+    preferred = starts[numpy.isin(kinds, wanted)]
+    return preferred if len(preferred) > 0 else starts
+
+
+def walk(board: numpy.ndarray, path: List[Tuple], visited: set) -> List[Tuple]:
+    walked = []
+    row, col = path[-1]
+    while True:
+        options = [n for n in get_same_kind_neighbours(board, row, col) if n not in visited]
+        if len(options) == 0:
+            return walked
+        # Warnsdorff's rule: go where the fewest onward options remain, which keeps paths long
+        row, col = min(options, key=lambda n: sum(m not in visited for m in get_same_kind_neighbours(board, *n)))
+        visited.add((row, col))
+        walked.append((row, col))
+
+
+def short_path_policy(board: Board, play: Play, random: numpy.random.Generator) -> List[Tuple]:
+    starts = get_move_starts(board, play)
+    row, col = starts[random.integers(len(starts))]
+    first, second = get_same_kind_neighbours(board.get_board(), row, col)[:2]
+    return [first, (row, col), second]
+
+
+def greedy_path_policy(board: Board, play: Play, random: numpy.random.Generator) -> List[Tuple]:
+    cells = board.get_board()
+    starts = get_move_starts(board, play)
+    row, col = starts[random.integers(len(starts))]
+    start = (int(row), int(col))
+    visited = {start}
+    forward = walk(cells, [start], visited)
+    backward = walk(cells, [start], visited)
+    backward.reverse()
+    return backward + [start] + forward
+
+
+def solver_policy(board: Board, play: Play, random: numpy.random.Generator) -> List[Tuple]:
+    return board.find_hint(0.005)
+
+
+class SimulationReport(namedtuple("SimulationReport", ["games", "moves", "wins", "seconds"])):
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def moves_per_second(self) -> float:
+        return self.moves / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games > 0 else 0.0
+
+
+class Simulation:
+    def __init__(self, rows: int, columns: int, target: List[int], moves: int, policy: Policy, seed: int = None):
+        self.rows = rows
+        self.columns = columns
+        self.target = target.copy()
+        self.moves = moves
+        self.policy = policy
+        self.seed = seed
+        self.random = numpy.random.default_rng(seed)
+        self.result = None
+
+    def on_win(self, *args):
+        self.result = True
+
+    def on_lose(self, *args):
+        self.result = False
+
+    def play_game(self) -> Tuple[bool, int]:
+        self.result = None
+        board = Board(self.rows, self.columns, len(self.target), seed=self.random)
+        play = Play(self.target, self.moves, self.on_win, self.on_lose)
+        move_count = 0
+        while self.result is None:
+            path = self.policy(board, play, self.random)
+            apply_move(board, play, path)
+            move_count += 1
+        return self.result, move_count
+
+    def run(self, games: int) -> SimulationReport:
+        begin = time.perf_counter()
+        moves = 0
+        wins = 0
+        for _ in range(games):
+            won, move_count = self.play_game()
+            moves += move_count
+            wins += int(won)
+        return SimulationReport(games, moves, wins, time.perf_counter() - begin)
+
+
+policies = dict(short=short_path_policy, greedy=greedy_path_policy, solver=solver_policy)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play Happy Connect games without a display")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=8)
+    parser.add_argument("--columns", type=int, default=8)
+    parser.add_argument("--target", type=int, nargs="+", default=[10, 10, 10, 10, 10, 10])
+    parser.add_argument("--moves", type=int, default=40)
+    parser.add_argument("--policy", choices=sorted(policies.keys()), default="greedy")
+    parser.add_argument("--seed", type=int, default=None)
+    arguments = parser.parse_args()
+
+    simulation = Simulation(arguments.rows, arguments.columns, arguments.target, arguments.moves,
+                            policies[arguments.policy], arguments.seed)
+    report = simulation.run(arguments.games)
+    print(f"{report.games} games, {report.moves} moves in {report.seconds:.2f} s")
+    print(f"{report.games_per_second:.1f} games/s, {report.moves_per_second:.1f} moves/s, "
+          f"win rate {report.win_rate:.1%}")
@@ -0,0 +1,159 @@
+import argparse
+import os
+import struct
+import time
+from typing import Callable, Tuple
+
+import numpy
+
+from src.Core import Board
+from src.Game import Play
+
+
+STORE_MAGIC = b"HCSS"
+STORE_VERSION = 1
+HEADER_FORMAT = "<4sIHHHQ"
+# Records start on a 64-byte boundary
+HEADER_SIZE = 64
+MASK_64 = (1 << 64) - 1
+
+
+def get_snapshot_dtype(rows: int, columns: int, kind_count: int) -> numpy.dtype:
+    # One fixed-size record per session; the PCG64 state and increment are 128-bit, stored as low/high words
+    return numpy.dtype([("used", numpy.uint8), ("rng_has_uint32", numpy.uint8),
+                        ("rows", "<u2"), ("columns", "<u2"), ("kind_count", "<u2"),
+                        ("rng_uinteger", "<u4"), ("moves", "<i4"),
+                        ("seed", "<u8"), ("rng_state", "<u8", (4,)),
+                        ("target", "<u4", (kind_count,)), ("picked", "<u4", (kind_count,)),
+                        ("cells", numpy.int8, (rows, columns))])
+
+
+def save_snapshot(record: numpy.ndarray, board: Board, play: Play):
+    # record is a 0-d view into a snapshot array, so everything is written in place
+    state = board.random.bit_generator.state
+    if state["bit_generator"] != "PCG64":
+        raise ValueError("Only PCG64 generators can be saved")
+    pcg_state, increment = state["state"]["state"], state["state"]["inc"]
+    record["used"] = 1
+    record["rows"], record["columns"] = board.dimension
+    record["kind_count"] = board.block_kind_count
+    record["seed"] = 0 if board.seed is None else board.seed & MASK_64
+    record["rng_state"] = [pcg_state & MASK_64, pcg_state >> 64, increment & MASK_64, increment >> 64]
+    record["rng_has_uint32"] = state["has_uint32"]
+    record["rng_uinteger"] = state["uinteger"]
+    record["target"] = play.target
+    record["picked"] = play.picked_counts
+    record["moves"] = play.moves
+    # A board loaded from this record already lives in it
+    if not numpy.may_share_memory(board.board, record["cells"]):
+        record["cells"] = board.board
+
+
+def load_snapshot(record: numpy.ndarray, on_win: Callable, on_lose: Callable) -> Tuple[Board, Play]:
+    # The board's cells stay a view of the record, so later updates write straight back into it
+    low, high, increment_low, increment_high = (int(word) for word in record["rng_state"])
+    random = numpy.random.Generator(numpy.random.PCG64())
+    random.bit_generator.state = dict(bit_generator="PCG64",
+                                      state=dict(state=low | high << 64, inc=increment_low | increment_high << 64),
+                                      has_uint32=int(record["rng_has_uint32"]), uinteger=int(record["rng_uinteger"]))
+    rows, columns = int(record["rows"]), int(record["columns"])
+    board = Board(rows, columns, int(record["kind_count"]), record["cells"], seed=random, shuffle_if_stuck=False)
+    board.seed = int(record["seed"])
+    play = Play(record["target"].tolist(), int(record["moves"]), on_win, on_lose)
+    play.picked_counts = record["picked"].tolist()
+    return board, play
+
+
+def to_bytes(board: Board, play: Play) -> bytes:
+    rows, columns = board.dimension
+    snapshot = numpy.zeros((), get_snapshot_dtype(rows, columns, board.block_kind_count))
+    save_snapshot(snapshot, board, play)
+    return snapshot.tobytes()
+
+
+def from_bytes(data: bytes, rows: int, columns: int, kind_count: int,
+               on_win: Callable, on_lose: Callable) -> Tuple[Board, Play]:
+    # Read-only bytes give a read-only board; pass a bytearray to keep playing on the same buffer
+    record = numpy.frombuffer(data, get_snapshot_dtype(rows, columns, kind_count), 1)[0:1].reshape(())
+    return load_snapshot(record, on_win, on_lose)
+
+
+class SessionStore:
+    # A file of fixed-size snapshot records, memory-mapped so any slot is reached without reading the rest
+    def __init__(self, file_path: str, rows: int = None, columns: int = None, kind_count: int = None,
+                 capacity: int = None):
+        self.file_path = file_path
+        if os.path.exists(file_path):
+            with open(file_path, "rb") as store_file:
+                magic, version, rows, columns, kind_count, capacity = struct.unpack_from(
+                    HEADER_FORMAT, store_file.read(HEADER_SIZE))
+            if magic != STORE_MAGIC or version != STORE_VERSION:
+                raise ValueError("Not a session store")
+        else:
+            # The file is sized up front; untouched slots stay sparse on disk
+            with open(file_path, "wb") as store_file:
+                store_file.write(struct.pack(HEADER_FORMAT, STORE_MAGIC, STORE_VERSION, rows, columns, kind_count,
+                                             capacity).ljust(HEADER_SIZE, b"\0"))
+                store_file.truncate(HEADER_SIZE + capacity * get_snapshot_dtype(rows, columns, kind_count).itemsize)
+        self.dimension = [rows, columns]
+        self.kind_count = kind_count
+        self.capacity = capacity
+        self.mapped = numpy.memmap(file_path, get_snapshot_dtype(rows, columns, kind_count), "r+",
+                                   HEADER_SIZE, (capacity,))
+        # A plain ndarray view of the same pages skips memmap's per-slice bookkeeping
+        self.records = self.mapped.view(numpy.ndarray)
+
+    def __len__(self) -> int:
+        return self.capacity
+
+    def get_record(self, index: int) -> numpy.ndarray:
+        return self.records[index:index + 1].reshape(())
+
+    def save(self, index: int, board: Board, play: Play):
+        save_snapshot(self.get_record(index), board, play)
+
+    def load(self, index: int, on_win: Callable, on_lose: Callable) -> Tuple[Board, Play]:
+        record = self.get_record(index)
+        if not record["used"]:
+            raise KeyError(index)
+        return load_snapshot(record, on_win, on_lose)
+
+    def is_used(self, index: int) -> bool:
+        return bool(self.records["used"][index])
+
+    def delete(self, index: int):
+        self.records["used"][index] = 0
+
+    def flush(self):
+        self.mapped.flush()
+
+    def close(self):
+        self.mapped.flush()
+        self.mapped = None
+        self.records = None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Time suspending and resuming sessions through a session store")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--capacity", type=int, default=1000000)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SessionStore(os.path.join(directory, "sessions.bin"), 8, 8, 6, arguments.capacity)
+        boards = [Board(8, 8, 6, seed=index) for index in range(100)]
+        play = Play([10] * 6, 40, lambda *args: None, lambda *args: None)
+        begin = time.perf_counter()
+        for index in range(arguments.sessions):
+            store.save(index * (arguments.capacity // arguments.sessions), boards[index % 100], play)
+        saved = time.perf_counter() - begin
+        begin = time.perf_counter()
+        for index in range(arguments.sessions):
+            store.load(index * (arguments.capacity // arguments.sessions), play.on_win, play.on_lose)
+        loaded = time.perf_counter() - begin
+        size = os.path.getsize(store.file_path)
+        store.close()
+    print(f"{arguments.capacity} slots, {size / 1e6:.0f} MB file")
+    print(f"save {saved / arguments.sessions * 1e6:.1f} us, load {loaded / arguments.sessions * 1e6:.1f} us per session")
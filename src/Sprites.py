@@ -1,17 +1,62 @@
 import numpy
 import pygame
 from pygame.sprite import Sprite
-from pygame.font import Font
 from pygame import Surface, Vector2, Color
 from pygame.locals import *
 from pygame.draw import circle, aalines
-from typing import List, Tuple
-from src.Core import Board
-from src.Game import Animation, Timeline, ANIMATION_BEGIN, Play
+from typing import List, Tuple, Union
+from src.Core import Board, split_diff, to_compact_diff
+from src.Game import Animation, Timeline, ANIMATION_BEGIN, Play, text_cache
+
+
+ZOOM_LEVELS = [0.25, 0.375, 0.5, 0.75, 1.0, 1.5, 2.0]
+
+
+class Viewport:
+    # The part of the board on screen: `size` pixels of board starting `offset` board pixels from its corner
+    def __init__(self, size: Vector2, row_count: int, column_count: int, block_size: Vector2, margin: int = 1):
+        self.size = Vector2(size)
+        self.row_count = row_count
+        self.column_count = column_count
+        self.block_size = Vector2(block_size)
+        self.offset = Vector2()
+        self.margin = margin
+
+    def get_board_size(self) -> Vector2:
+        return Vector2(self.column_count * self.block_size.x, self.row_count * self.block_size.y)
+
+    def move_to(self, offset: Vector2):
+        limit = self.get_board_size() - self.size
+        self.offset = Vector2(int(min(max(offset.x, 0), max(limit.x, 0))), int(min(max(offset.y, 0), max(limit.y, 0))))
+
+    def scroll(self, dx: float, dy: float):
+        self.move_to(self.offset + Vector2(dx, dy))
+
+    def set_block_size(self, block_size: Vector2, anchor: Vector2):
+        # The board point under the anchor stays under it
+        scale = Vector2(block_size.x / self.block_size.x, block_size.y / self.block_size.y)
+        self.block_size = Vector2(block_size)
+        self.move_to((self.offset + anchor).elementwise() * scale - anchor)
+
+    def get_visible_range(self) -> Tuple[int, int, int, int]:
+        end = self.offset + self.size
+        row_begin = max(int(self.offset.y // self.block_size.y) - self.margin, 0)
+        row_end = min(int(-(-end.y // self.block_size.y)) + self.margin, self.row_count)
+        column_begin = max(int(self.offset.x // self.block_size.x) - self.margin, 0)
+        column_end = min(int(-(-end.x // self.block_size.x)) + self.margin, self.column_count)
+        return row_begin, row_end, column_begin, column_end
+
+    def get_cell_at(self, point: Vector2) -> Tuple[int, int, float, float]:
+        # Viewport pixels to a cell, plus where in the cell the point falls as fractions of the block size
+        board_point = Vector2(point) + self.offset
+        column, column_remain = divmod(board_point.x, self.block_size.x)
+        row, row_remain = divmod(board_point.y, self.block_size.y)
+        return int(row), int(column), row_remain / self.block_size.y, column_remain / self.block_size.x
 
 
 class BoardSprite(Sprite):
-    def __init__(self, board: Board, surface: Surface, image_list: List[Surface] = None):
+    def __init__(self, board: Board, surface: Surface, image_list: List[Surface] = None,
+                 min_block_size: float = 0):
         Sprite.__init__(self)
         self.image = surface
         self.rect = surface.get_rect()
@@ -19,9 +64,11 @@ class BoardSprite(Sprite):
 
         width, height = self.rect.width, self.rect.height
         self.board_row_count, self.board_column_count = board.get_board().shape
-        self.block_size = Vector2()
-        self.block_size.x = width / board.get_board().shape[0]
-        self.block_size.y = height / board.get_board().shape[1]
+        # Boards too big for the surface keep a readable block size and scroll instead
+        self.base_block_size = Vector2(max(width / self.board_column_count, min_block_size),
+                                       max(height / self.board_row_count, min_block_size))
+        self.viewport = Viewport(Vector2(width, height), self.board_row_count, self.board_column_count,
+                                 self.base_block_size)
 
         if image_list is None:
             block_images = [self.get_default_image(number) for number in range(board.block_kind_count)]
@@ -31,29 +78,74 @@ class BoardSprite(Sprite):
                 more_images = [self.get_default_image(number)
                                for number in range(len(image_list), board.block_kind_count)]
                 block_images.extend(more_images)
-        self.block_images = block_images
-
-        self.new_blocks = []
+        self.source_images = block_images
+        # Every kind and its highlighted variant live in one atlas per zoom level, built on first use
+        self.atlases = {}
+        self.zoom = 1.0
+        self.atlas = self.get_atlas(self.zoom)
+        self.block_images = [self.atlas.get_image(kind, BlockAtlas.NORMAL) for kind in range(len(block_images))]
+        self.selected_images = [self.atlas.get_image(kind, BlockAtlas.SELECTED) for kind in range(len(block_images))]
+        self.view_images = self.block_images
+        self.view_selected_images = self.selected_images
+
+        # Only the cells in the window (what the viewport shows plus a margin) have sprites
+        self.window = (0, 0, 0, 0)
+        self.new_blocks = {}
         self.blocks = []
+        self.spawn_pool = []
         self.sync_board()
 
         self.timeline = Timeline(0)
+        self.animating = False
+        # The background is static; blocks are composited on a cached layer and redrawn only where they change
+        self.layer = self.image.copy()
+        self.layer_dirty = True
+        self.last_selected = []
+
+    @property
+    def block_size(self) -> Vector2:
+        return self.viewport.block_size
+
+    def get_atlas(self, zoom: float) -> "BlockAtlas":
+        if zoom not in self.atlases:
+            # Tiles are cut to the block size at this zoom, rounded up so fractional block sizes leave no gaps
+            block_size = self.base_block_size * zoom
+            size = max(int(-(-block_size.x // 1)), 1), max(int(-(-block_size.y // 1)), 1)
+            images = [image if image.get_size() == size else pygame.transform.smoothscale(image, size)
+                      for image in self.source_images]
+            self.atlases[zoom] = BlockAtlas(images)
+        return self.atlases[zoom]
 
     def sync_board(self):
-        self.new_blocks = [None] * (self.board_row_count * self.board_column_count)
-        self.blocks = []
-        for array_index, block_kind in enumerate(self.board.get_board().flat):
-            row, column = divmod(array_index, int(self.board_column_count))
-            screen_position = Vector2()
-            screen_position.x = column * self.block_size.x
-            screen_position.y = row * self.block_size.y
-            self.blocks.append(BlockSprite(screen_position, self.block_images[block_kind]))
+        # Sprites are created once and then repointed at the board in place after every animation
+        row_begin, row_end, column_begin, column_end = self.window = self.viewport.get_visible_range()
+        window_columns = column_end - column_begin
+        cells = self.board.get_board()[row_begin:row_end, column_begin:column_end]
+        while len(self.blocks) < cells.size:
+            self.blocks.append(BlockSprite(Vector2(), self.view_images[0], self.view_selected_images[0]))
+        del self.blocks[cells.size:]
+        # Plain int arithmetic, so a sync allocates no Vector2 per cell
+        block_width, block_height = self.block_size.x, self.block_size.y
+        for index, (block, block_kind) in enumerate(zip(self.blocks, cells.flat)):
+            row, column = divmod(index, window_columns)
+            block.base_rect.topleft = int((column + column_begin) * block_width), int((row + row_begin) * block_height)
+            block.reset(self.view_images[block_kind], self.view_selected_images[block_kind], block_kind)
+        self.spawn_pool.extend(self.new_blocks.values())
+        self.new_blocks = {}
+
+    def get_spawn_block(self, position: Vector2, block_kind: int) -> "BlockSprite":
+        if len(self.spawn_pool) == 0:
+            return BlockSprite(position, self.view_images[block_kind], self.view_selected_images[block_kind],
+                               block_kind)
+        block = self.spawn_pool.pop()
+        block.place(position)
+        block.reset(self.view_images[block_kind], self.view_selected_images[block_kind], block_kind)
+        return block
 
     def get_default_image(self, number: int) -> Surface:
-        sw, sh = int(self.block_size.x), int(self.block_size.y)
+        sw, sh = int(self.base_block_size.x), int(self.base_block_size.y)
         surface = Surface((sw, sh))
-        font = Font(None, 24)
-        image = font.render(f"{number}", True, Color(255, 255, 255))
+        image = text_cache.render(f"{number}", 24)
         cx, cy = int(sw / 2), int(sh / 2)
         surface.blit(image, image.get_rect(center=(cx, cy)))
         return surface
@@ -62,79 +154,183 @@ class BoardSprite(Sprite):
         return self.block_size
 
     def board_to_sprite_index(self, board_index: Tuple) -> int:
+        # -1 for cells outside the window
         row, column = board_index
-        return column + self.board_row_count * row
+        row_begin, row_end, column_begin, column_end = self.window
+        if row_begin <= row < row_end and column_begin <= column < column_end:
+            return (row - row_begin) * (column_end - column_begin) + column - column_begin
+        return -1
 
     def get_position_by_index(self, board_index: Tuple) -> Vector2:
         row, column = board_index
         return Vector2(column, row).elementwise() * self.block_size
 
-    def add_animation(self, animations: List[Tuple]):
-        to_hide = []
-        to_slide = []
-        for a in animations:
-            if a[2] == -1 and a[3] == -1:
-                to_hide.append(a)
-            else:
-                to_slide.append(a)
-                if a[0] < 0 or a[1] < 0:
-                    temp_index = self.board_to_sprite_index((a[0], a[1]))
-                    position = self.get_position_by_index((a[0], a[1]))
-                    new_board = self.board.get_board()
-                    image = self.block_images[new_board[a[2], a[3]]]
-                    self.new_blocks[temp_index] = BlockSprite(position, image)
-        for index, a in enumerate(to_hide):
-            block_index = self.board_to_sprite_index((a[0], a[1]))
-            block = self.blocks[block_index]
+    def in_window(self, rows: numpy.ndarray, columns: numpy.ndarray) -> numpy.ndarray:
+        row_begin, row_end, column_begin, column_end = self.window
+        return (rows >= row_begin) & (rows < row_end) & (columns >= column_begin) & (columns < column_end)
+
+    def add_animation(self, animations: Union[List[Tuple], numpy.ndarray]):
+        if not isinstance(animations, numpy.ndarray):
+            animations = to_compact_diff(animations)
+        # Blocks that neither start nor end in the window just appear in place at the next sync
+        starts_inside = self.in_window(animations["src_row"], animations["src_col"])
+        ends_inside = self.in_window(animations["dest_row"], animations["dest_col"])
+        to_hide, to_slide, to_spawn = split_diff(animations[starts_inside | ends_inside])
+        new_board = self.board.get_board()
+
+        hide_delay = self.timeline.get_last_time()
+        for index, (row, col) in enumerate(zip(to_hide["src_row"].tolist(), to_hide["src_col"].tolist())):
+            block = self.blocks[self.board_to_sprite_index((row, col))]
             animation = Animation(begin_state=None,
                                   end_state=None,
-                                  delay=self.timeline.get_last_time(),
+                                  delay=hide_delay + index * 100,
                                   duration=100,
                                   setter=block.hide)
             self.timeline.add_animation(animation)
 
         common_delay = self.timeline.get_last_time()
-        for index, a in enumerate(to_slide):
-            block_index = self.board_to_sprite_index((a[0], a[1]))
-            block = self.new_blocks[block_index] if block_index < 0 else self.blocks[block_index]
-            animation = Animation(begin_state=self.get_position_by_index((a[0], a[1])),
-                                  end_state=self.get_position_by_index((a[2], a[3])),
-                                  delay=common_delay,
-                                  duration=500,
-                                  setter=block.slide)
-            self.timeline.add_animation(animation)
+        for moves in [to_slide, to_spawn]:
+            for src_row, src_col, dest_row, dest_col in zip(moves["src_row"].tolist(), moves["src_col"].tolist(),
+                                                            moves["dest_row"].tolist(), moves["dest_col"].tolist()):
+                block_index = self.board_to_sprite_index((src_row, src_col))
+                begin_state = self.get_position_by_index((src_row, src_col))
+                if block_index < 0:
+                    # New blocks, and blocks sliding in from outside the window, borrow a pooled sprite
+                    block = self.get_spawn_block(begin_state, new_board[dest_row, dest_col])
+                    self.new_blocks[(src_row, src_col)] = block
+                else:
+                    block = self.blocks[block_index]
+                animation = Animation(begin_state=begin_state,
+                                      end_state=self.get_position_by_index((dest_row, dest_col)),
+                                      delay=common_delay,
+                                      duration=500,
+                                      setter=block.slide)
+                self.timeline.add_animation(animation)
 
     def play_animation(self, begin_tick: int):
         self.timeline.animation_begin(begin_tick)
+        self.animating = True
         event = pygame.event.Event(ANIMATION_BEGIN, dict(timeline_id=0))
         pygame.event.post(event)
 
     def on_animation_end(self):
         self.sync_board()
         self.timeline.reset_clock()
+        self.animating = False
+        self.layer_dirty = True
 
     def update(self, ticks: int):
         self.timeline.update(ticks)
 
-    def render(self, screen: Surface, position: Vector2, selected: List[Tuple]):
+    def scroll(self, dx: float, dy: float):
+        self.viewport.scroll(dx, dy)
+        self.on_view_changed()
+
+    def set_zoom(self, zoom: float, anchor: Vector2):
+        self.zoom = zoom
+        self.viewport.set_block_size(self.base_block_size * zoom, anchor)
+        atlas = self.get_atlas(zoom)
+        kinds = range(len(self.source_images))
+        self.view_images = [atlas.get_image(kind, BlockAtlas.NORMAL) for kind in kinds]
+        self.view_selected_images = [atlas.get_image(kind, BlockAtlas.SELECTED) for kind in kinds]
+        self.on_view_changed()
+
+    def zoom_by(self, steps: int, anchor: Vector2):
+        level = min(range(len(ZOOM_LEVELS)), key=lambda index: abs(ZOOM_LEVELS[index] - self.zoom))
+        self.set_zoom(ZOOM_LEVELS[min(max(level + steps, 0), len(ZOOM_LEVELS) - 1)], anchor)
+
+    def on_view_changed(self):
+        # Scrolling only waits for animations to finish; the window is rebuilt around the new view
+        self.sync_board()
+        self.layer_dirty = True
+
+    def get_cells_rect(self, cells: List[Tuple]) -> Rect:
+        rows = [row for row, _ in cells]
+        columns = [column for _, column in cells]
+        top_left = self.get_position_by_index((min(rows), min(columns))) - self.viewport.offset
+        bottom_right = self.get_position_by_index((max(rows) + 1, max(columns) + 1)) - self.viewport.offset
+        return Rect(int(top_left.x), int(top_left.y),
+                    int(bottom_right.x) - int(top_left.x), int(bottom_right.y) - int(top_left.y)).clip(self.rect)
+
+    def render(self, screen: Surface, position: Vector2, selected: List[Tuple]) -> List[Rect]:
         px = int(position.x)
         py = int(position.y)
-        pixels = self.image.copy()
+        selected_cells = set(selected)
+        if self.layer_dirty or self.animating:
+            dirty = self.rect
+        elif selected != self.last_selected:
+            # Paths only grow or shrink at the end, so the box around both paths holds every changed pixel
+            dirty = self.get_cells_rect(self.last_selected + selected)
+        else:
+            return []
+        self.layer.blit(self.image, dirty, area=dirty)
+        view_atlas = self.get_atlas(self.zoom)
+        atlas, areas = view_atlas.image, view_atlas.areas
+        ox, oy = int(self.viewport.offset.x), int(self.viewport.offset.y)
+        row_begin, _, column_begin, column_end = self.window
+        window_columns = column_end - column_begin
+        to_blit = []
         for index, block in enumerate(self.blocks):
-            row, column = divmod(index, int(self.board_column_count))
-            block_selected = selected.count((row, column)) > 0
-            block.render(pixels, block_selected)
-        for index, block in enumerate(self.new_blocks):
-            if block is not None:
-                block.render(pixels, False)
-        screen.blit(pixels, pixels.get_rect(topleft=(px, py)))
+            if block.show:
+                rect = block.rect.move(-ox, -oy)
+                if dirty.colliderect(rect):
+                    row, column = divmod(index, window_columns)
+                    cell = row + row_begin, column + column_begin
+                    variant = BlockAtlas.SELECTED if cell in selected_cells else BlockAtlas.NORMAL
+                    to_blit.append((atlas, rect, areas[variant][block.kind]))
+        for block in self.new_blocks.values():
+            rect = block.rect.move(-ox, -oy)
+            if block.show and dirty.colliderect(rect):
+                to_blit.append((atlas, rect, areas[BlockAtlas.NORMAL][block.kind]))
+        self.layer.blits(to_blit, doreturn=False)
+        self.layer_dirty = False
+        self.last_selected = list(selected)
+        screen_rect = dirty.move(px, py)
+        screen.blit(self.layer, screen_rect, area=dirty)
+        return [screen_rect]
+
+
+def get_selected_image(image: Surface) -> Surface:
+    pixels = image.copy()
+    cover = Surface((image.get_size()))
+    cover.fill(Color(100, 100, 100))
+    pixels.blit(cover, image.get_rect(topleft=(0, 0)), special_flags=BLEND_MULT)
+    return pixels
+
+
+class BlockAtlas:
+    NORMAL, SELECTED = 0, 1
+
+    def __init__(self, images: List[Surface]):
+        width = max(image.get_width() for image in images)
+        height = max(image.get_height() for image in images)
+        variants = [images, [get_selected_image(image) for image in images]]
+        self.image = Surface((width * len(images), height * len(variants)), SRCALPHA)
+        self.areas = []
+        for variant, variant_images in enumerate(variants):
+            areas = []
+            for kind, image in enumerate(variant_images):
+                area = image.get_rect(topleft=(kind * width, variant * height))
+                self.image.blit(image, area)
+                areas.append(area)
+            self.areas.append(areas)
+        if pygame.display.get_surface() is not None:
+            self.image = self.image.convert_alpha()
+
+    def get_area(self, kind: int, variant: int = 0) -> Rect:
+        return self.areas[variant][kind]
+
+    def get_image(self, kind: int, variant: int = 0) -> Surface:
+        return self.image.subsurface(self.areas[variant][kind])
 
 
 class BlockSprite(Sprite):
-    def __init__(self, position: Vector2, image: Surface):
+    def __init__(self, position: Vector2, image: Surface, selected_image: Surface = None, kind: int = -1):
         Sprite.__init__(self)
         px, py = int(position.x), int(position.y)
         self.image = image
+        self.kind = kind
+        self.selected_image = get_selected_image(image) if selected_image is None else selected_image
         self.base_rect = image.get_rect(topleft=(px, py))
         self.rect = image.get_rect(topleft=(px, py))
         self.show = True
@@ -142,49 +338,70 @@ class BlockSprite(Sprite):
     def get_base_rect(self) -> Tuple:
         return self.base_rect
 
+    def place(self, position: Vector2):
+        self.base_rect.topleft = int(position.x), int(position.y)
+
+    def reset(self, image: Surface, selected_image: Surface, kind: int = -1):
+        self.image = image
+        self.selected_image = selected_image
+        self.kind = kind
+        # Pooled sprites outlive a zoom, so the rects take the new image's size
+        self.base_rect.size = self.rect.size = image.get_size()
+        self.rect.topleft = self.base_rect.topleft
+        self.show = True
+
     def slide(self, begin_state: Vector2, end_state: Vector2, progress: float):
         # mapped_progress = 0.5 + (progress - 0.25) * (progress - 0.5) * (progress - 0.75) / (0.75 * 0.25)
         mapped_progress = progress
         target = begin_state.lerp(end_state, mapped_progress)
-        base_x, base_y = self.base_rect.topleft
-        dx, dy = int(target.x) - base_x, int(target.y) - base_y
-        self.rect = self.base_rect.move(dx, dy)
+        self.rect.topleft = int(target.x), int(target.y)
 
     def hide(self, *args):
         self.show = False
 
     def render(self, board_surface: Surface, selected: bool = False):
         if self.show:
-            pixels = self.image.copy()
-            rect = self.image.get_rect(topleft=(0, 0))
-            # board_surface.blit(self.image, self.rect)
-            if selected:
-                cover = Surface((self.image.get_size()))
-                cover.fill(Color(100, 100, 100))
-                pixels.blit(cover, rect, special_flags=BLEND_MULT)
-            board_surface.blit(pixels, self.rect)
+            board_surface.blit(self.selected_image if selected else self.image, self.rect)
 
 
 class PathSprite(Sprite):
-    def __init__(self, board_position: Vector2, board_size: Vector2, block_size: Vector2):
+    def __init__(self, board_position: Vector2, board_size: Vector2, block_size: Vector2, viewport: Viewport = None):
         Sprite.__init__(self)
         board_position_int = int(board_position.x), int(board_position.y)
         board_size_int = int(board_size.x), int(board_size.y)
-        self.block_width, self.block_height = int(block_size.x), int(block_size.y)
+        self.viewport = viewport
+        self.block_size = Vector2(block_size)
         self.image = Surface(board_size_int)
         self.image.fill(Color(0, 0, 0))
         self.rect = Rect(board_position_int, board_size_int)
+        self.path = self.image.copy()
+        self.last_selected = []
+        self.last_view = None
 
-    def render(self, screen: Surface, selected: List[Tuple]):
+    def render(self, screen: Surface, selected: List[Tuple], dirty_rects: List[Rect] = None):
         if len(selected) > 0:
-            circle_centres = [((col + 0.5) * self.block_width, (row + 0.5) * self.block_height)
-                              for (row, col) in selected]
-            surface = self.image.copy()
-            if len(selected) > 1:
-                aalines(surface, Color(255, 255, 255), False, circle_centres)
-            for centre in circle_centres:
-                circle(surface, Color(255, 255, 255), centre, 5)
-            screen.blit(surface, self.rect, special_flags=BLEND_MAX)
+            if self.viewport is None:
+                view = (self.block_size, Vector2())
+            else:
+                view = (Vector2(self.viewport.block_size), Vector2(self.viewport.offset))
+            if selected != self.last_selected or view != self.last_view:
+                block_size, offset = view
+                circle_centres = [((col + 0.5) * block_size.x - offset.x, (row + 0.5) * block_size.y - offset.y)
+                                  for (row, col) in selected]
+                self.path = self.image.copy()
+                if len(selected) > 1:
+                    aalines(self.path, Color(255, 255, 255), False, circle_centres)
+                for centre in circle_centres:
+                    circle(self.path, Color(255, 255, 255), centre, 5)
+                self.last_selected = list(selected)
+                self.last_view = view
+            # Only redraw over the parts of the board that were repainted underneath
+            rects = [self.rect] if dirty_rects is None else dirty_rects
+            for rect in rects:
+                clipped = rect.clip(self.rect)
+                if clipped.width > 0 and clipped.height > 0:
+                    area = clipped.move(-self.rect.x, -self.rect.y)
+                    screen.blit(self.path, clipped, area=area, special_flags=BLEND_MAX)
 
 
 class PlaySprite(Sprite):
@@ -202,6 +419,7 @@ class PlaySprite(Sprite):
 
         px, py = int(play_position.x), int(play_position.y)
         self.rect = self.image.get_rect(topleft=(px, py))
+        self.rendered_counts = None
 
     def add_animation(self, update_kind: int, update_count: int):
         self.updating_kind = update_kind
@@ -236,9 +454,12 @@ class PlaySprite(Sprite):
     def update(self, ticks: int):
         self.timeline.update(ticks)
 
-    def render(self, screen: Surface, icon_list: List[Surface]):
+    def render(self, screen: Surface, icon_list: List[Surface]) -> List[Rect]:
+        counts = (self.picked_count.copy(), self.target.copy())
+        if counts == self.rendered_counts:
+            return []
+        self.rendered_counts = counts
         pixels = self.image.copy()
-        font = Font(None, 24)
         for i, _ in enumerate(self.target):
             current = self.picked_count[i]
             target = self.target[i]
@@ -246,6 +467,7 @@ class PlaySprite(Sprite):
             centre_right = self.centre_rights[i]
             block_image = icon_list[i]
             pixels.blit(block_image, block_image.get_rect(topleft=topleft))
-            font_surface = font.render(f"{current} / {target}", True, Color(255, 255, 255))
+            font_surface = text_cache.render(f"{current} / {target}", 24)
             pixels.blit(font_surface, font_surface.get_rect(midright=centre_right))
         screen.blit(pixels, self.rect)
+        return [self.rect]
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+import pygame
+from pygame import Surface, Color
+
+from src.Assets import AssetStore, read_cache_index
+
+pygame.init()
+
+manifest = dict(icon_list=["a.png", "b.png"], board_image="board.png")
+
+
+class AssetStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.asset_path = self.directory.name
+        for file_name, colour in [("a.png", Color(200, 0, 0)), ("b.png", Color(0, 200, 0)),
+                                  ("board.png", Color(0, 0, 200, 128))]:
+            surface = Surface((20, 10), pygame.SRCALPHA)
+            surface.fill(colour)
+            pygame.image.save(surface, os.path.join(self.asset_path, file_name))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_load_lazily(self):
+        store = AssetStore(self.asset_path, manifest=manifest)
+        self.assertEqual(len(store.loaded), 0)
+        board_image = store["board_image"]
+        self.assertEqual(list(store.loaded.keys()), ["board_image"])
+        self.assertEqual(board_image.get_size(), (20, 10))
+        self.assertEqual(board_image.get_at((5, 5)), Color(0, 0, 200, 128))
+        icons = store["icon_list"]
+        self.assertEqual(icons[1].get_at((0, 0)), Color(0, 200, 0))
+        self.assertIs(store["icon_list"], icons)
+
+    def test_cache_is_reused_and_refreshed(self):
+        AssetStore(self.asset_path, manifest=manifest)["board_image"]
+        cache_path = os.path.join(self.asset_path, "__cache__", "assets.bin")
+        index = read_cache_index(cache_path)
+        self.assertEqual(sorted(index["entries"].keys()), ["a.png", "b.png", "board.png"])
+
+        surface = Surface((4, 4), pygame.SRCALPHA)
+        surface.fill(Color(1, 2, 3))
+        pygame.image.save(surface, os.path.join(self.asset_path, "a.png"))
+        os.utime(os.path.join(self.asset_path, "a.png"), ns=(0, 0))
+        icons = AssetStore(self.asset_path, manifest=manifest)["icon_list"]
+        self.assertEqual(icons[0].get_size(), (4, 4))
+        self.assertEqual(icons[0].get_at((0, 0)), Color(1, 2, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
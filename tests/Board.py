@@ -4,8 +4,10 @@ from pygame import Surface, Vector2, Color
 from pygame.rect import Rect
 import numpy
 
-from src.Core import Board
-from src.Sprites import BoardSprite, BlockSprite
+from src.Core import Board, BoardBatch, MoveIndex, PathSolver, find_best_path, label_components
+from src.Core import PathSelection, pack_paths, validate_paths
+from src.Core import DIFF_REMOVE, DIFF_SLIDE, DIFF_SPAWN, split_diff, to_compact_diff, to_tuple_diff
+from src.Sprites import BoardSprite, BlockSprite, BlockAtlas, Viewport
 
 pygame.init()
 
@@ -96,6 +98,43 @@ class BoardTest(unittest.TestCase):
                                (1, 3, 2, 3), (0, 3, 1, 3), (-1, 3, 0, 3)]
         self.assertCountEqual(diff, expected_animations)
 
+    def test_update_whole_column(self):
+        board_obj = Board(4, 4, 3)
+        board_obj.board = numpy.array([[0, 1, 1, 1],
+                                       [1, 1, 2, 1],
+                                       [2, 1, 1, 2],
+                                       [2, 1, 2, 2]], numpy.int8)
+        to_remove = [(0, 1), (1, 1), (2, 1), (3, 1)]
+        diff = board_obj.update(to_remove)
+        self.assertTrue(numpy.all(board_obj.board > -1))
+        self.assertEqual(board_obj.board[:, [0, 2, 3]].tolist(), [[0, 1, 1], [1, 2, 1], [2, 1, 2], [2, 2, 2]])
+        expected_animations = [(0, 1, -1, -1), (1, 1, -1, -1), (2, 1, -1, -1), (3, 1, -1, -1),
+                               (-4, 1, 0, 1), (-3, 1, 1, 1), (-2, 1, 2, 1), (-1, 1, 3, 1)]
+        self.assertCountEqual(diff, expected_animations)
+
+    def test_update_compact(self):
+        board_obj = Board(4, 4, 4)
+        board_obj.board = numpy.array([[0, 0, 0, 0],
+                                       [1, 1, 2, 1],
+                                       [2, 2, 2, 2],
+                                       [3, 3, 2, 3]], numpy.int8)
+        to_remove = [(2, 0), (2, 1), (1, 2), (2, 2), (3, 2), (2, 3)]
+        diff = board_obj.update(to_remove, compact=True)
+        to_hide, to_slide, to_spawn = split_diff(diff)
+        self.assertTrue(numpy.all(to_hide["op"] == DIFF_REMOVE))
+        self.assertTrue(numpy.all(to_slide["op"] == DIFF_SLIDE))
+        self.assertTrue(numpy.all(to_spawn["op"] == DIFF_SPAWN))
+        self.assertEqual((len(to_hide), len(to_slide), len(to_spawn)), (6, 7, 6))
+        self.assertEqual(to_tuple_diff(to_hide), [(r, c, -1, -1) for r, c in to_remove])
+        self.assertCountEqual(to_tuple_diff(to_spawn), [(-1, 0, 0, 0), (-1, 1, 0, 1), (-3, 2, 0, 2),
+                                                        (-2, 2, 1, 2), (-1, 2, 2, 2), (-1, 3, 0, 3)])
+
+    def test_compact_round_trip(self):
+        diff = [(2, 0, -1, -1), (1, 0, 2, 0), (-1, 0, 0, 0), (0, 0, 1, 0), (3, 3, 0, 1)]
+        compact = to_compact_diff(diff)
+        self.assertEqual(compact["op"].tolist(), [DIFF_REMOVE, DIFF_SLIDE, DIFF_SLIDE, DIFF_SLIDE, DIFF_SPAWN])
+        self.assertCountEqual(to_tuple_diff(compact), diff)
+
     def test_check_if_possible_1(self):
         board = Board(4, 4, 3)
         board.board = numpy.array([[1, 0, 0, 1],
@@ -120,6 +159,111 @@ class BoardTest(unittest.TestCase):
                                    [2, 0, 2, 2]])
         self.assertTrue(not board.is_possible_to_move())
 
+    def test_label_components(self):
+        board = numpy.array([[1, 0, 0, 1],
+                             [0, 2, 2, 0],
+                             [0, 1, 0, 1],
+                             [2, 0, 2, 2]])
+        labels, sizes = label_components(board)
+        self.assertEqual(labels.shape, (4, 4))
+        self.assertEqual(sum(sizes), 16)
+        self.assertEqual(sizes[labels[0, 1]], 7)
+        self.assertEqual(labels[0, 1], labels[3, 1])
+        self.assertEqual(labels[1, 1], labels[1, 2])
+        self.assertNotEqual(labels[0, 0], labels[2, 1])
+        self.assertEqual(sizes[labels[3, 3]], 2)
+
+    def test_label_components_large(self):
+        board = numpy.zeros([1000, 1000], numpy.int8)
+        board[1::2, :] = 1
+        board[1::4, -1] = 0
+        board[3::4, 0] = 0
+        labels, sizes = label_components(board)
+        self.assertEqual(numpy.amax(sizes), numpy.count_nonzero(board == 0))
+        self.assertEqual(labels[0, 0], labels[-2, 0])
+
+    def test_move_index_after_update(self):
+        board = Board(4, 4, 4)
+        board.board = numpy.array([[0, 0, 0, 0],
+                                   [1, 1, 2, 1],
+                                   [2, 2, 2, 2],
+                                   [3, 3, 2, 3]], numpy.int8)
+        self.assertTrue(board.is_possible_to_move())
+        board.update([(2, 0), (2, 1), (1, 2), (2, 2), (3, 2), (2, 3)])
+        move_index = board.get_move_index()
+        rebuilt = MoveIndex(board.board.copy())
+        self.assertTrue(numpy.array_equal(move_index.degrees, rebuilt.degrees))
+        self.assertEqual(move_index.movable_count, rebuilt.movable_count)
+        _, sizes = board.get_components()
+        self.assertEqual(board.is_possible_to_move(), numpy.amax(sizes) > 2)
+
+    def test_stats_after_update(self):
+        board = Board(10, 7, 5, seed=4)
+        board.board = numpy.zeros((10, 7), numpy.int8)
+        self.assertEqual(board.get_count(), [70, 0, 0, 0, 0])
+        for _ in range(20):
+            path = board.find_hint()
+            board.update(path, compact=True)
+            if not board.is_possible_to_move():
+                board.shuffle(compact=True)
+            stats = board.get_stats()
+            columns = numpy.array([numpy.bincount(column, minlength=5) for column in board.board.T])
+            self.assertTrue(numpy.array_equal(stats.column_counts, columns))
+            self.assertEqual(board.get_count(), numpy.bincount(board.board.ravel(), minlength=5).tolist())
+            self.assertEqual(board.get_largest_components(), MoveIndex(board.board).get_largest_components(5))
+
+    def test_largest_components(self):
+        board = Board(4, 4, 3)
+        board.board = numpy.array([[1, 0, 0, 1],
+                                   [0, 2, 2, 0],
+                                   [0, 1, 0, 1],
+                                   [2, 0, 2, 2]], numpy.int8)
+        self.assertEqual(board.get_largest_components(), [7, 1, 2])
+
+    def test_find_best_path(self):
+        board = numpy.array([[0, 1, 0, 0],
+                             [0, 2, 2, 1],
+                             [1, 1, 0, 1],
+                             [2, 0, 2, 2]], numpy.int8)
+        self.assertEqual(find_best_path(board), [])
+        board = numpy.array([[1, 0, 0, 1],
+                             [0, 2, 2, 0],
+                             [0, 1, 0, 1],
+                             [2, 0, 2, 2]], numpy.int8)
+        path = find_best_path(board)
+        self.assertEqual(len(path), 7)
+        self.assertEqual(len(set(path)), 7)
+        self.assertTrue(all(board[p] == 0 for p in path))
+        self.assertTrue(all(max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 for a, b in zip(path[:-1], path[1:])))
+
+    def test_solver_is_anytime(self):
+        board = numpy.zeros([20, 20], numpy.int8)
+        solver = PathSolver(board)
+        first = solver.step(0.0001)
+        self.assertTrue(len(first) > 2)
+        for _ in range(10):
+            solver.step(0.005)
+        self.assertTrue(len(solver.best) >= len(first))
+        self.assertTrue(len(solver.best) <= 400)
+
+    def test_solver_starts_without_labelling(self):
+        # Nothing is built for the whole board or a whole component before the first check of the clock
+        for kind_count in [1, 6]:
+            board = Board(300, 300, kind_count, seed=1)
+            move_index = board.get_move_index()
+            solver = PathSolver(board.get_board(), degrees=move_index.degrees)
+            next(solver.search)
+            self.assertTrue(numpy.count_nonzero(solver.claimed) <= 16 * 8 + 1)
+            hint = board.find_hint()
+            self.assertTrue(len(hint) > 2)
+            self.assertIsNone(move_index.components)
+
+    def test_find_hint(self):
+        board = Board(8, 8, 4)
+        hint = board.find_hint()
+        self.assertTrue(len(hint) > 2)
+        self.assertTrue(all(board.board[p] == board.board[hint[0]] for p in hint))
+
     def test_shuffle(self):
         board = Board(4, 4, 3)
         board.board = numpy.array([[0, 1, 0, 0],
@@ -127,12 +271,127 @@ class BoardTest(unittest.TestCase):
                                    [1, 1, 0, 1],
                                    [2, 0, 2, 2]])
         prev_count = [6, 5, 5]
-        board.count = prev_count.copy()
+        self.assertEqual(board.get_count(), prev_count)
         board.shuffle()
-        new_count = board.count
+        new_count = board.get_count()
         self.assertTrue(board.is_possible_to_move())
         self.assertEqual(prev_count, new_count)
 
+    def test_shuffle_diff(self):
+        board = Board(40, 30, 6, seed=2)
+        before = board.get_board().copy()
+        diff = board.shuffle(compact=True)
+        after = board.get_board()
+        self.assertTrue(numpy.all(diff["op"] == DIFF_SLIDE))
+        self.assertTrue(numpy.array_equal(after[diff["dest_row"], diff["dest_col"]],
+                                          before[diff["src_row"], diff["src_col"]]))
+        self.assertEqual(len(numpy.unique(diff["dest_row"] * 30 + diff["dest_col"])), len(diff))
+        unmoved = numpy.ones(after.shape, bool)
+        unmoved[diff["dest_row"], diff["dest_col"]] = False
+        self.assertTrue(numpy.array_equal(after[unmoved], before[unmoved]))
+        self.assertTrue(numpy.array_equal(numpy.bincount(after.ravel()), numpy.bincount(before.ravel())))
+        self.assertTrue(board.is_possible_to_move())
+
+
+class PathSelectionTest(unittest.TestCase):
+    board = numpy.array([[0, 1, 0, 0],
+                         [0, 2, 2, 1],
+                         [1, 1, 2, 1],
+                         [2, 0, 2, 2]], numpy.int8)
+
+    def test_offer(self):
+        selection = PathSelection(self.board)
+        self.assertFalse(selection.start((-1, 2)))
+        self.assertTrue(selection.start((1, 1)))
+        self.assertFalse(selection.offer((1, 1)))
+        self.assertFalse(selection.offer((0, 0)))
+        self.assertFalse(selection.offer((3, 3)))
+        self.assertTrue(selection.offer((1, 2)))
+        self.assertTrue(selection.offer((2, 2)))
+        self.assertFalse(selection.offer((1, 1)))
+        self.assertTrue((1, 1) in selection)
+        self.assertTrue(selection.offer((1, 2)))
+        self.assertEqual(selection.cells, [(1, 1), (1, 2)])
+        self.assertFalse((2, 2) in selection)
+        self.assertFalse(selection.is_valid())
+        self.assertTrue(selection.offer((2, 2)))
+        self.assertTrue(selection.offer((3, 3)))
+        self.assertTrue(selection.is_valid())
+        selection.clear()
+        self.assertEqual(len(selection), 0)
+        self.assertFalse(numpy.any(selection.marked))
+
+    def test_validate_paths(self):
+        paths = [[(1, 1), (1, 2), (2, 2), (3, 3)],
+                 [(1, 1), (1, 2)],
+                 [(1, 1), (1, 2), (2, 2), (1, 2)],
+                 [(1, 3), (2, 3), (1, 3)],
+                 [(0, 0), (1, 0), (0, 1)],
+                 [(2, 2), (3, 2), (3, 3), (3, 4)],
+                 [(1, 1), (2, 2), (1, 2)],
+                 [(0, 2), (0, 3), (1, 3)],
+                 []]
+        valid = validate_paths(self.board, *pack_paths(paths))
+        self.assertEqual(valid.tolist(), [True, False, False, False, False, False, True, False, False])
+
+
+class BoardBatchTest(unittest.TestCase):
+    def test_create(self):
+        batch = BoardBatch(5, 8, 8, 3)
+        self.assertEqual(batch.boards.shape, (5, 8, 8))
+        self.assertEqual(batch.boards.dtype, numpy.int8)
+        self.assertEqual(batch.count.shape, (5, 3))
+        self.assertTrue(all(batch.count.sum(axis=1) == 8 * 8))
+        self.assertTrue(all(batch.is_possible_to_move()))
+
+    def test_update_same_as_board(self):
+        boards = []
+        for _ in range(3):
+            board = Board(4, 4, 4)
+            board.board = numpy.array([[0, 0, 0, 0],
+                                       [1, 1, 2, 1],
+                                       [2, 2, 2, 2],
+                                       [3, 3, 2, 3]], numpy.int8)
+            boards.append(board)
+        batch = BoardBatch.from_boards(boards, seed=7)
+        paths = [[(2, 0), (2, 1), (1, 2), (2, 2), (3, 2), (2, 3)], [(0, 0), (0, 1), (0, 2)], []]
+        random = numpy.random.default_rng(7)
+        for board, path in zip(boards, paths):
+            board.random = random
+            if len(path) > 0:
+                board.update(path)
+        batch.update(paths)
+        for index, board in enumerate(boards):
+            self.assertTrue(numpy.array_equal(batch.get_board(index), board.get_board()))
+            self.assertEqual(batch.is_possible_to_move()[index], board.is_possible_to_move())
+
+    def test_create_same_as_board(self):
+        batch = BoardBatch(20, 5, 5, 6, seed=9)
+        random = numpy.random.default_rng(9)
+        for index in range(20):
+            board = Board(5, 5, 6, seed=random)
+            self.assertTrue(numpy.array_equal(batch.get_board(index), board.get_board()))
+
+    def test_create_same_as_board_when_often_stuck(self):
+        batch = BoardBatch(200, 3, 3, 5, seed=4)
+        random = numpy.random.default_rng(4)
+        for index in range(200):
+            board = Board(3, 3, 5, seed=random)
+            self.assertTrue(numpy.array_equal(batch.get_board(index), board.get_board()))
+
+    def test_check_if_possible(self):
+        boards = numpy.array([[[0, 1, 0, 0],
+                               [0, 2, 2, 1],
+                               [1, 1, 0, 1],
+                               [2, 0, 2, 2]],
+                              [[0, 0, 1, 0],
+                               [0, 1, 2, 2],
+                               [2, 1, 0, 1],
+                               [2, 0, 2, 1]]], numpy.int8)
+        batch = BoardBatch(2, 4, 4, 3, boards)
+        self.assertEqual(batch.is_possible_to_move().tolist(), [False, True])
+        self.assertEqual(batch.get_count().tolist(), [[6, 5, 5], [6, 5, 5]])
+
 
 class BoardSpriteTest(unittest.TestCase):
     def test_create(self):
@@ -144,6 +403,43 @@ class BoardSpriteTest(unittest.TestCase):
         self.assertEqual(len(board_sprite.block_images), 3)
         self.assertTrue(isinstance(board_sprite.block_images[2], Surface))
 
+    def test_add_animation(self):
+        board = Board(4, 4, 4)
+        board.board = numpy.array([[0, 0, 0, 0],
+                                   [1, 1, 2, 1],
+                                   [2, 2, 2, 2],
+                                   [3, 3, 2, 3]], numpy.int8)
+        board_sprite = BoardSprite(board, Surface((400, 400)))
+        diff = board.update([(2, 0), (2, 1), (1, 2), (2, 2), (3, 2), (2, 3)], compact=True)
+        board_sprite.add_animation(diff)
+        self.assertEqual(len(board_sprite.timeline.animations), len(diff))
+        self.assertEqual(board_sprite.timeline.get_last_time(), 6 * 100 + 500)
+        self.assertEqual(len(board_sprite.new_blocks), 6)
+
+    def test_sync_reuses_sprites(self):
+        board = Board(4, 4, 4)
+        board.board = numpy.array([[0, 0, 0, 0],
+                                   [1, 1, 2, 1],
+                                   [2, 2, 2, 2],
+                                   [3, 3, 2, 3]], numpy.int8)
+        board_sprite = BoardSprite(board, Surface((400, 400)))
+        blocks = list(board_sprite.blocks)
+        board_sprite.add_animation(board.update([(2, 0), (2, 1), (1, 2), (2, 2), (3, 2), (2, 3)], compact=True))
+        spawned = list(board_sprite.new_blocks.values())
+        board_sprite.timeline.update(2000)
+        board_sprite.on_animation_end()
+        self.assertTrue(all(a is b for a, b in zip(blocks, board_sprite.blocks)))
+        self.assertEqual(len(board_sprite.new_blocks), 0)
+        self.assertCountEqual(board_sprite.spawn_pool, spawned)
+        for index, block in enumerate(board_sprite.blocks):
+            row, column = divmod(index, 4)
+            self.assertIs(block.image, board_sprite.block_images[board.board[row, column]])
+            self.assertEqual(block.rect, block.get_base_rect())
+            self.assertTrue(block.show)
+
+        board_sprite.add_animation(board.update([(0, 0), (0, 1), (0, 2)], compact=True))
+        self.assertEqual(len(board_sprite.spawn_pool), 3)
+
     def test_render(self):
         board = Board(8, 8, 2)
         board.board = numpy.zeros([8, 8], numpy.int8)
@@ -159,6 +455,127 @@ class BoardSpriteTest(unittest.TestCase):
         self.assertEqual(screen.get_at((125, 325)), Color(0, 200, 0))
         self.assertEqual(screen.get_at((225, 225)), Color(200, 0, 0))
 
+    def test_render_dirty_rects(self):
+        board = Board(8, 8, 2)
+        board.board = numpy.zeros([8, 8], numpy.int8)
+        image_list = [Surface((50, 50)), Surface((50, 50))]
+        image_list[0].fill(Color(200, 0, 0))
+        image_list[1].fill(Color(0, 200, 0))
+        board_sprite = BoardSprite(board, Surface((400, 400)), image_list)
+        screen = Surface((400, 600))
+        position = Vector2(0, 100)
+        self.assertEqual(board_sprite.render(screen, position, []), [Rect(0, 100, 400, 400)])
+        self.assertEqual(board_sprite.render(screen, position, []), [])
+        selected = [(1, 1), (2, 2)]
+        self.assertEqual(board_sprite.render(screen, position, selected), [Rect(50, 150, 100, 100)])
+        self.assertEqual(screen.get_at((75, 175)), Color(79, 0, 0))
+        selected.append((2, 3))
+        self.assertEqual(board_sprite.render(screen, position, selected), [Rect(50, 150, 150, 100)])
+        self.assertEqual(board_sprite.render(screen, position, []), [Rect(50, 150, 150, 100)])
+        self.assertEqual(screen.get_at((75, 175)), Color(200, 0, 0))
+
+    def test_non_square_board(self):
+        board = Board(4, 8, 3, seed=1)
+        board_sprite = BoardSprite(board, Surface((400, 200)))
+        self.assertEqual(board_sprite.block_size, Vector2(50, 50))
+        self.assertEqual(board_sprite.blocks[board_sprite.board_to_sprite_index((3, 7))].rect, Rect(350, 150, 50, 50))
+
+    def test_large_board_window(self):
+        board = Board(100, 120, 4, seed=1)
+        image_list = [Surface((50, 50)) for _ in range(4)]
+        board_sprite = BoardSprite(board, Surface((400, 400)), image_list, min_block_size=25)
+        self.assertEqual(board_sprite.window, (0, 17, 0, 17))
+        # Icons are scaled to the block size so tiles do not overlap
+        self.assertEqual(board_sprite.blocks[0].image.get_size(), (25, 25))
+        self.assertEqual(len(board_sprite.blocks), 17 * 17)
+        board_sprite.scroll(1000, 510)
+        self.assertEqual(board_sprite.viewport.offset, Vector2(1000, 510))
+        self.assertEqual(board_sprite.window, (19, 38, 39, 57))
+        board_sprite.scroll(10000, 10000)
+        self.assertEqual(board_sprite.viewport.offset, Vector2(120 * 25 - 400, 100 * 25 - 400))
+        row_begin, row_end, column_begin, column_end = board_sprite.window
+        for index, block in enumerate(board_sprite.blocks):
+            row, column = divmod(index, column_end - column_begin)
+            self.assertEqual(block.kind, board.board[row + row_begin, column + column_begin])
+
+        # Only moves that start or end in the window are animated
+        diff = board.shuffle(compact=True)
+        board_sprite.add_animation(diff)
+        self.assertTrue(len(board_sprite.timeline.animations) < 2 * len(board_sprite.blocks))
+        board_sprite.timeline.update(2000)
+        board_sprite.on_animation_end()
+        for index, block in enumerate(board_sprite.blocks):
+            row, column = divmod(index, column_end - column_begin)
+            self.assertEqual(block.kind, board.board[row + row_begin, column + column_begin])
+
+    def test_edge_blocks_drawn_after_zooming_in(self):
+        board = Board(100, 100, 2, seed=1)
+        image_list = [Surface((40, 40)), Surface((40, 40))]
+        image_list[0].fill(Color(200, 0, 0))
+        image_list[1].fill(Color(0, 200, 0))
+        board_sprite = BoardSprite(board, Surface((400, 400)), image_list, min_block_size=40)
+        board_sprite.zoom_by(2, Vector2(0, 0))
+        board_sprite.viewport.move_to(Vector2(60, 60))
+        board_sprite.on_view_changed()
+        self.assertEqual(board_sprite.blocks[0].rect.size, (80, 80))
+        screen = Surface((400, 400))
+        board_sprite.render(screen, Vector2(), [])
+        # (5, 5) on screen is inside cell (0, 0), which is only partly in view
+        self.assertEqual(screen.get_at((5, 5)), image_list[board.board[0, 0]].get_at((0, 0)))
+
+    def test_fractional_block_size(self):
+        board = Board(12, 12, 2, seed=1)
+        image_list = [Surface((50, 50)), Surface((50, 50))]
+        image_list[1].fill(Color(0, 200, 0))
+        board_sprite = BoardSprite(board, Surface((400, 400)), image_list)
+        self.assertEqual(board_sprite.block_images[0].get_size(), (34, 34))
+        screen = Surface((400, 400))
+        board_sprite.render(screen, Vector2(), [])
+        # The last column ends at the surface edge instead of spilling past it
+        kind = board.board[11, 11]
+        self.assertEqual(screen.get_at((399, 399)), image_list[kind].get_at((0, 0)))
+
+    def test_zoom(self):
+        board = Board(100, 100, 2, seed=1)
+        image_list = [Surface((40, 40)), Surface((40, 40))]
+        image_list[1].fill(Color(0, 200, 0))
+        board_sprite = BoardSprite(board, Surface((400, 400)), image_list, min_block_size=40)
+        board_sprite.scroll(800, 800)
+        board_sprite.zoom_by(-2, Vector2(200, 200))
+        self.assertEqual(board_sprite.zoom, 0.5)
+        self.assertEqual(board_sprite.block_size, Vector2(20, 20))
+        self.assertEqual(board_sprite.viewport.offset, Vector2(300, 300))
+        self.assertEqual(board_sprite.blocks[0].image.get_size(), (20, 20))
+        self.assertEqual(board_sprite.block_images[1].get_size(), (40, 40))
+        screen = Surface((400, 400))
+        board_sprite.render(screen, Vector2(), [])
+        kind = board.board[25, 25]
+        self.assertEqual(screen.get_at((210, 210)), image_list[kind].get_at((0, 0)))
+
+
+class ViewportTest(unittest.TestCase):
+    def test_cells(self):
+        viewport = Viewport(Vector2(400, 300), 50, 40, Vector2(20, 10))
+        self.assertEqual(viewport.get_visible_range(), (0, 31, 0, 21))
+        viewport.scroll(105, 55)
+        self.assertEqual(viewport.get_cell_at(Vector2(0, 0)), (5, 5, 0.5, 0.25))
+        self.assertEqual(viewport.get_visible_range(), (4, 37, 4, 27))
+        viewport.scroll(-1000, 1000)
+        self.assertEqual(viewport.offset, Vector2(0, 200))
+
+
+class BlockAtlasTest(unittest.TestCase):
+    def test_create(self):
+        images = [Surface((50, 50)), Surface((50, 50)), Surface((50, 50))]
+        for image, colour in zip(images, [Color(200, 0, 0), Color(0, 200, 0), Color(0, 0, 200)]):
+            image.fill(colour)
+        atlas = BlockAtlas(images)
+        self.assertEqual(atlas.image.get_size(), (150, 100))
+        self.assertEqual(atlas.get_area(1, BlockAtlas.SELECTED), Rect(50, 50, 50, 50))
+        self.assertEqual(atlas.get_image(1).get_at((10, 10)), Color(0, 200, 0))
+        self.assertEqual(atlas.get_image(2, BlockAtlas.SELECTED).get_at((10, 10)), Color(0, 0, 79))
+        self.assertIs(atlas.get_image(0).get_parent(), atlas.image)
+
 
 class BlockSpriteTest(unittest.TestCase):
     def test_create(self):
@@ -178,6 +595,18 @@ class BlockSpriteTest(unittest.TestCase):
         self.assertEqual(board.get_at((160, 110)), Color(0, 200, 0))
         self.assertEqual(board.get_at((10, 10)), Color(0, 0, 0))
 
+    def test_render_selected(self):
+        surface = Surface((50, 50))
+        surface.fill(Color(0, 200, 0))
+        block = BlockSprite(Vector2(150, 100), surface)
+        selected_image = block.selected_image
+        board = Surface((400, 400))
+        block.render(board, True)
+        self.assertEqual(board.get_at((160, 110)), Color(0, 79, 0))
+        block.render(board, True)
+        self.assertIs(block.selected_image, selected_image)
+        self.assertEqual(surface.get_at((10, 10)), Color(0, 200, 0))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import numpy
+
+from src.Bot import LookaheadBot, evaluate_samples, get_candidate_paths
+from src.Core import Board, is_valid_path
+from src.Game import Play
+from src.Simulation import Simulation
+
+
+cells = numpy.array([[0, 0, 0, 1],
+                     [2, 2, 1, 1],
+                     [2, 2, 1, 3],
+                     [0, 3, 0, 3]], numpy.int8)
+
+
+class LookaheadBotTest(unittest.TestCase):
+    def test_candidate_paths(self):
+        board = Board(4, 4, 4, cells.copy())
+        play = Play([3, 3, 2, 3], 10, lambda *args: None, lambda *args: None)
+        candidates = get_candidate_paths(board, play, 8, 0.01)
+        self.assertTrue(all(is_valid_path(cells, path) for path in candidates))
+        self.assertCountEqual([len(path) for path in candidates], [3, 4, 3, 4])
+
+    def test_evaluate_samples(self):
+        score = evaluate_samples(cells.tobytes(), (4, 4), 4, [(0, 0), (0, 1), (0, 2)],
+                                 [3, 0, 0, 0], [0, 0, 0, 0], 5, 1, 4)
+        self.assertEqual(score, 1000.0 + 4)
+
+    def test_choose(self):
+        board = Board(4, 4, 4, cells.copy())
+        play = Play([0, 0, 4, 0], 10, lambda *args: None, lambda *args: None)
+        with LookaheadBot(samples=4, workers=2, seed=3) as bot:
+            path = bot.choose(board, play)
+            self.assertTrue(is_valid_path(cells, path))
+            self.assertEqual(cells[path[0]], 2)
+            self.assertEqual(len(path), 4)
+            self.assertTrue(bot.evaluations > 0)
+
+    def test_plays_through_simulation(self):
+        with LookaheadBot(samples=2, workers=2, seed=3) as bot:
+            report = Simulation(6, 6, [3, 3, 3, 3], 5, bot.choose, seed=1).run(1)
+        self.assertEqual(report.games, 1)
+        self.assertTrue(1 <= report.moves <= 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
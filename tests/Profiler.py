@@ -0,0 +1,123 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+import pygame
+from collections import namedtuple
+
+from src.Game import Scene
+from src.Profiler import FrameProfiler
+
+pygame.init()
+
+Context = namedtuple("Context", ["screen", "assets", "data"])
+
+
+def record_frame(profiler: FrameProfiler, timings: dict):
+    profiler.begin_frame()
+    for name, seconds in timings.items():
+        profiler.add(name, seconds)
+    profiler.end_frame(0)
+
+
+class FrameProfilerTest(unittest.TestCase):
+    def test_percentiles_and_overruns(self):
+        profiler = FrameProfiler(window=10)
+        for index in range(20):
+            record_frame(profiler, dict(render=0.05 if index == 19 else 0.001, sleep=0.03))
+        self.assertEqual(profiler.frame_count, 20)
+        self.assertEqual(profiler.overruns, 1)
+        p50, p90, p99 = profiler.get_percentiles("render")
+        self.assertAlmostEqual(p50, 0.001)
+        self.assertTrue(p99 > 0.04)
+        # Only the last window frames count
+        for _ in range(10):
+            record_frame(profiler, dict(render=0.001))
+        self.assertAlmostEqual(profiler.get_summary()["timings"]["render"]["max"], 0.001)
+        self.assertEqual(profiler.get_percentiles("BoardSprite"), [0.0, 0.0, 0.0])
+
+    def test_frames_kept_only_when_recording(self):
+        profiler = FrameProfiler(window=4, record_frames=False)
+        for _ in range(10):
+            record_frame(profiler, dict(render=0.002))
+        self.assertEqual(profiler.frames, [])
+        self.assertEqual(profiler.frame_count, 10)
+        self.assertAlmostEqual(profiler.get_percentiles("render")[0], 0.002)
+
+    def test_late_names_are_zero_before(self):
+        profiler = FrameProfiler(window=4)
+        record_frame(profiler, dict(render=0.002))
+        record_frame(profiler, dict(render=0.002, BoardSprite=0.001))
+        self.assertEqual(profiler.get_names()[-2:], ["BoardSprite", "frame"])
+        self.assertEqual(profiler.get_summary()["timings"]["BoardSprite"]["mean"], 0.0005)
+
+    def test_export(self):
+        profiler = FrameProfiler()
+        record_frame(profiler, dict(events=0.001, render=0.002))
+        record_frame(profiler, dict(render=0.003, PathSprite=0.001))
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "frames.csv")
+            profiler.save(csv_path)
+            with open(csv_path, newline="") as csv_file:
+                rows = list(csv.DictReader(csv_file))
+            json_path = os.path.join(directory, "frames.json")
+            profiler.save(json_path)
+            with open(json_path) as json_file:
+                report = json.load(json_file)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(float(rows[0]["PathSprite"]), 0.0)
+        self.assertEqual(float(rows[1]["render"]), 0.003)
+        self.assertEqual(report["summary"]["frames"], 2)
+        self.assertEqual(report["frames"][0]["events"], 0.001)
+
+
+class OverlayTest(unittest.TestCase):
+    def test_restores_scene_pixels(self):
+        profiler = FrameProfiler()
+        record_frame(profiler, dict(render=0.002))
+        screen = pygame.Surface((200, 200))
+        screen.fill((0, 0, 255))
+        overlay = profiler.overlay
+        self.assertEqual(overlay.draw(screen), [])
+        overlay.toggle()
+        rects = overlay.draw(screen)
+        self.assertEqual(len(rects), 1)
+        self.assertNotEqual(screen.get_at(rects[0].topleft), pygame.Color(0, 0, 255))
+        self.assertEqual(overlay.restore(screen), rects)
+        self.assertEqual(screen.get_at(rects[0].topleft), pygame.Color(0, 0, 255))
+        self.assertEqual(overlay.restore(screen), [])
+
+
+class ProfiledScene(Scene):
+    def __init__(self, context):
+        Scene.__init__(self, context)
+        self.frames = 0
+
+    def is_animating(self) -> bool:
+        return True
+
+    def render(self):
+        self.frames += 1
+        with self.measure("Sprite"):
+            pass
+        return []
+
+
+class ProfiledMainloopTest(unittest.TestCase):
+    def test_phases_are_recorded(self):
+        profiler = FrameProfiler()
+        context = Context(pygame.display.set_mode((200, 200)), {}, dict(profiler=profiler))
+        scene = ProfiledScene(context)
+        pygame.event.clear()
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_F3, mod=0))
+        pygame.time.set_timer(pygame.QUIT, 200, True)
+        scene.mainloop()
+        self.assertTrue(profiler.overlay.visible)
+        self.assertEqual(profiler.frame_count, scene.frames)
+        self.assertEqual(profiler.get_names(), ["events", "update", "render", "flip", "sleep", "Sprite", "frame"])
+        self.assertTrue(profiler.get_percentiles("sleep")[0] > 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import numpy
+
+from src.Core import Board
+from src.Game import Play
+from src.Replay import MoveLog, replay
+from src.Simulation import greedy_path_policy
+
+
+def record_session(seed: int, move_count: int) -> (MoveLog, Board, Play):
+    random = numpy.random.default_rng(seed)
+    target = [1000] * 6
+    board = Board(8, 8, 6, seed=seed)
+    play = Play(target, 1000, lambda *args: None, lambda *args: None)
+    log = MoveLog(8, 8, 6, board.seed, target, 1000)
+    for _ in range(move_count):
+        path = greedy_path_policy(board, play, random)
+        log.add_move(path)
+        play.update(board.get_board_at_position(*path[0]), len(path))
+        board.update(path, compact=True)
+        if not board.is_possible_to_move():
+            board.shuffle(compact=True)
+    return log, board, play
+
+
+class SeedTest(unittest.TestCase):
+    def test_same_seed_same_session(self):
+        first = Board(8, 8, 6, seed=3)
+        second = Board(8, 8, 6, seed=3)
+        self.assertTrue(numpy.array_equal(first.get_board(), second.get_board()))
+        path = [(0, 0), (0, 1), (0, 2)]
+        self.assertTrue(numpy.array_equal(first.update(path, compact=True), second.update(path, compact=True)))
+        self.assertTrue(numpy.array_equal(first.shuffle(compact=True), second.shuffle(compact=True)))
+        self.assertTrue(numpy.array_equal(first.get_board(), second.get_board()))
+
+    def test_seed_is_drawn_when_missing(self):
+        board = Board(8, 8, 6)
+        self.assertIsInstance(board.seed, int)
+        self.assertTrue(numpy.array_equal(Board(8, 8, 6, seed=board.seed).get_board(), board.get_board()))
+
+
+class MoveLogTest(unittest.TestCase):
+    def test_round_trip(self):
+        log, _, _ = record_session(5, 30)
+        data = log.to_bytes()
+        loaded = MoveLog.from_bytes(data)
+        self.assertEqual(loaded.seed, log.seed)
+        self.assertEqual(loaded.target, log.target)
+        self.assertEqual(loaded.moves, log.moves)
+        self.assertEqual(list(loaded), list(log))
+        self.assertEqual(len(data), 20 + 12 + sum(2 + len(cells) for cells in log.paths))
+
+    def test_large_board_round_trip(self):
+        log = MoveLog(300, 300, 6, 1, [10] * 6, 40)
+        self.assertEqual(log.cell_dtype, numpy.dtype("<u4"))
+        path = [(299, 299), (299, 298), (0, 257)]
+        log.add_move(path)
+        loaded = MoveLog.from_bytes(log.to_bytes())
+        self.assertEqual(loaded.dimension, [300, 300])
+        self.assertEqual(list(loaded), [path])
+
+    def test_rejects_boards_too_large(self):
+        with self.assertRaises(ValueError):
+            MoveLog(70000, 8, 6, 1, [10] * 6, 40)
+        with self.assertRaises(ValueError):
+            MoveLog(8, 8, 6, 1, [10] * 6, 70000)
+
+    def test_rejects_other_data(self):
+        with self.assertRaises(ValueError):
+            MoveLog.from_bytes(b"HCAC" + bytes(20))
+
+    def test_replay(self):
+        log, board, play = record_session(5, 30)
+        replayed_board, replayed_play = replay(MoveLog.from_bytes(log.to_bytes()))
+        self.assertTrue(numpy.array_equal(replayed_board.get_board(), board.get_board()))
+        self.assertEqual(replayed_play.picked_counts, play.picked_counts)
+        self.assertEqual(replayed_play.moves, play.moves)
+
+    def test_replay_until(self):
+        log, _, _ = record_session(5, 30)
+        _, partial, _ = record_session(5, 10)
+        board, play = replay(log, 10)
+        self.assertTrue(numpy.array_equal(board.get_board(), partial.get_board()))
+        self.assertEqual(play.moves, 990)
+
+
+if __name__ == '__main__':
+    unittest.main()
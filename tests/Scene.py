@@ -6,14 +6,15 @@ import numpy
 from src.Core import Board
 from src.Scenes import MainScene
 from src.Sprites import BoardSprite
-from src.Game import Play
+from src.Game import Animation, Play, Scene, TextCache, Timeline, ANIMATION_END, apply_move
 
 pygame.init()
 
 screen = pygame.Surface((400, 600))
 board_image = pygame.Surface((400, 400))
-assets = dict(icon_list=None, board_image=board_image)
-data = {}
+play_image = pygame.Surface((400, 100))
+assets = dict(icon_list=None, board_image=board_image, play_image=play_image)
+data = dict(play=Play([10, 10, 10, 10], 40, lambda *args: None, lambda *args: None))
 Context = namedtuple("Context", ["screen", "assets", "data"])
 context = Context(screen=screen, assets=assets, data=data)
 board = numpy.array([[0, 0, 0, 0],
@@ -114,6 +115,28 @@ class MainSceneTests(unittest.TestCase):
         scene.on_mouse_move(position[14])
         self.assertEqual(scene.selected, [(2, 0), (2, 1), (2, 2), (2, 3), (1, 2)])
 
+    def test_fast_drag_crosses_every_block(self):
+        self.setUp()
+        scene.on_mouse_down(button, position[8])
+        scene.on_mouse_move(position[11])
+        self.assertEqual(scene.selected, [(2, 0), (2, 1), (2, 2), (2, 3)])
+        scene.on_mouse_move(position[8])
+        self.assertEqual(scene.selected, [(2, 0)])
+
+    def test_click_after_scrolling(self):
+        self.setUp()
+        scene.board = Board(20, 20, 4)
+        scene.board_sprite = BoardSprite(scene.board, scene.board_region, min_block_size=50)
+        scene.on_key_down(pygame.K_RIGHT, 0)
+        scene.on_key_down(pygame.K_DOWN, 0)
+        scene.board_sprite.scroll(50, 0)
+        self.assertEqual(scene.board_sprite.viewport.offset, pygame.Vector2(100, 50))
+        scene.on_mouse_down(button, (25, 125))
+        self.assertEqual(scene.selected, [(1, 2)])
+        scene.on_mouse_up(button, (25, 125))
+        scene.on_mouse_down(button, (25, 95))
+        self.assertEqual(scene.selected, [])
+
 
 end_game = None
 
@@ -150,6 +173,124 @@ class PlayTest(unittest.TestCase):
         self.assertTrue(lost)
         self.assertEqual(end_game, [2, 2, 0, 0, 0, 0])
 
+    def test_apply_move(self):
+        play = Play([2, 2, 2], 10, PlayTest.on_win, PlayTest.on_lose)
+        # Fifty kinds leave no three refilled blocks alike, so the board is shuffled
+        stuck_board = Board(2, 2, 50, numpy.array([[0, 0], [0, 1]], numpy.int8), seed=3)
+        diff, shuffle = apply_move(stuck_board, play, [(0, 0), (0, 1), (1, 0)])
+        self.assertEqual(play.picked_counts, [2, 0, 0])
+        self.assertEqual(play.moves, 9)
+        self.assertTrue(len(diff) > 0)
+        self.assertFalse(shuffle is None)
+        movable_board = Board(4, 4, 4, board.copy(), seed=3)
+        diff, shuffle = apply_move(movable_board, None, [(0, 0), (0, 1), (0, 2), (0, 3)])
+        self.assertTrue(movable_board.is_possible_to_move())
+        self.assertTrue(shuffle is None)
+
+
+class CountingScene(Scene):
+    def __init__(self, context):
+        Scene.__init__(self, context)
+        self.frames = 0
+        self.animating = False
+
+    def is_animating(self) -> bool:
+        return self.animating
+
+    def render(self):
+        self.frames += 1
+        return []
+
+
+class MotionScene(Scene):
+    def __init__(self, context):
+        Scene.__init__(self, context)
+        self.calls = []
+
+    def on_mouse_move(self, position: tuple):
+        self.calls.append(("move", position))
+
+    def on_mouse_down(self, buttons: tuple, position: tuple):
+        self.calls.append(("down", position))
+
+
+class MotionCoalescingTest(unittest.TestCase):
+    def test_motion_runs_collapse(self):
+        motion_scene = MotionScene(context)
+        events = [pygame.event.Event(pygame.MOUSEMOTION, pos=(index, index)) for index in range(5)]
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(4, 4), button=1))
+        events.extend(pygame.event.Event(pygame.MOUSEMOTION, pos=(index, 0)) for index in range(10, 13))
+        motion_scene.handle_events(events)
+        self.assertEqual(motion_scene.calls, [("move", (4, 4)), ("down", (4, 4)), ("move", (12, 0))])
+
+
+class MainloopTest(unittest.TestCase):
+    def test_idle_scene_waits_for_events(self):
+        counting_scene = CountingScene(context)
+        pygame.event.clear()
+        pygame.time.set_timer(pygame.QUIT, 300, True)
+        counting_scene.mainloop()
+        self.assertEqual(counting_scene.frames, 2)
+
+    def test_animating_scene_keeps_rendering(self):
+        counting_scene = CountingScene(context)
+        counting_scene.animating = True
+        pygame.event.clear()
+        pygame.time.set_timer(pygame.QUIT, 300, True)
+        counting_scene.mainloop()
+        self.assertTrue(counting_scene.frames > 5)
+
+
+class TimelineTest(unittest.TestCase):
+    def test_update(self):
+        progress = {}
+
+        def setter_for(name):
+            return lambda begin_state, end_state, p: progress.__setitem__(name, p)
+
+        timeline = Timeline(0, capacity=2)
+        for index in range(5):
+            timeline.add_animation(Animation(begin_state=None, end_state=None, delay=index * 100,
+                                             duration=100, setter=setter_for(index)))
+        self.assertEqual(timeline.get_last_time(), 500)
+        timeline.animation_begin(1000)
+        timeline.update(1150)
+        self.assertEqual(progress, {0: 1.0, 1: 0.5})
+        pygame.event.clear()
+        timeline.update(1700)
+        self.assertEqual(progress, {index: 1.0 for index in range(5)})
+        self.assertEqual(len(pygame.event.get(ANIMATION_END)), 1)
+        self.assertEqual(len(timeline.animations), 0)
+        self.assertEqual(timeline.get_last_time(), 0)
+
+    def test_finished_animations_do_not_hide_others(self):
+        calls = []
+        timeline = Timeline(0)
+        for index in range(4):
+            timeline.add_animation(Animation(begin_state=index, end_state=None, delay=0,
+                                             duration=100, setter=lambda b, e, p: calls.append(b)))
+        timeline.update(200)
+        self.assertEqual(calls, [0, 1, 2, 3])
+
+
+class TextCacheTest(unittest.TestCase):
+    def test_reuses_fonts_and_surfaces(self):
+        cache = TextCache(capacity=2)
+        first = cache.render("3 / 10", 24)
+        self.assertIs(cache.render("3 / 10", 24), first)
+        self.assertIs(cache.get_font(24), cache.get_font(24))
+        self.assertIsNot(cache.render("3 / 10", 24, pygame.Color(255, 0, 0)), first)
+
+    def test_evicts_least_recently_used(self):
+        cache = TextCache(capacity=2)
+        first = cache.render("a", 24)
+        cache.render("b", 24)
+        cache.render("a", 24)
+        cache.render("c", 24)
+        self.assertEqual(len(cache.surfaces), 2)
+        self.assertIs(cache.render("a", 24), first)
+        self.assertNotIn((None, 24, "b", (255, 255, 255, 255)), cache.surfaces)
+
 
 if __name__ == '__main__':
     unittest.main()
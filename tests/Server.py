@@ -0,0 +1,118 @@
+import asyncio
+import json
+import unittest
+import numpy
+
+from src.Core import Board, DIFF_DTYPE
+from src.Server import GameServer, LatencyHistogram, LoadClient, run_load_test
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.get_percentile(50), 0.0)
+        for _ in range(90):
+            histogram.record(0.0003)
+        for _ in range(10):
+            histogram.record(0.02)
+        self.assertEqual(histogram.get_count(), 100)
+        self.assertEqual(histogram.get_percentile(50), 512e-6)
+        self.assertEqual(histogram.get_percentile(99), 32768e-6)
+        self.assertAlmostEqual(histogram.to_dict()["mean"], 0.00227)
+
+
+class GameServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = GameServer(queue_size=2)
+        self.host, self.port = await self.server.start()
+        self.client = LoadClient(self.host, self.port)
+        await self.client.connect()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.stop()
+
+    async def test_move(self):
+        created = await self.client.request(op="new", rows=4, columns=4, target=[3, 3, 3], moves=5, seed=8)
+        self.assertEqual(created["op"], "created")
+        board = Board(4, 4, 3, seed=8)
+        self.assertEqual(created["board"], board.get_board().tolist())
+        path = [[int(row), int(col)] for row, col in board.find_hint()]
+        reply = await self.client.request(op="move", session=created["session"], path=path)
+        self.assertEqual(reply["op"], "update")
+        kind = board.get_board_at_position(*path[0])
+        diff = board.update([tuple(cell) for cell in path], compact=True)
+        self.assertTrue(numpy.array_equal(numpy.array([tuple(row) for row in reply["diff"]], DIFF_DTYPE), diff))
+        self.assertEqual(reply["picked"][kind], min(len(path), 3))
+        self.assertEqual(reply["moves"], 4)
+
+    async def test_invalid_move(self):
+        created = await self.client.request(op="new", rows=4, columns=4, target=[3, 3, 3], moves=5, seed=8)
+        reply = await self.client.request(op="move", session=created["session"], path=[[0, 0], [3, 3], [0, 1]])
+        self.assertEqual(reply["op"], "error")
+        reply = await self.client.request(op="move", session=created["session"] + 1, path=[])
+        self.assertEqual(reply["message"], "Unknown session")
+
+    async def test_session_survives_bad_moves(self):
+        created = await self.client.request(op="new", rows=4, columns=4, target=[3, 3, 3], moves=5, seed=8)
+        for path in [[[10 ** 30, 0], [0, 1], [1, 1]], [[-1, 0], [0, 0], [1, 0]], [[0, 0, 0]], None]:
+            # A dead worker never answers, so wait a bounded time
+            reply = await asyncio.wait_for(self.client.request(op="move", session=created["session"], path=path), 5)
+            self.assertEqual(reply["op"], "error")
+        path = [[int(row), int(col)] for row, col in Board(4, 4, 3, seed=8).find_hint()]
+        reply = await asyncio.wait_for(self.client.request(op="move", session=created["session"], path=path), 5)
+        self.assertEqual(reply["op"], "update")
+
+    async def test_malformed_requests_keep_the_connection(self):
+        created = await self.client.request(op="new", rows=4, columns=4, target=[3, 3, 3], moves=5, seed=8)
+        reply = await self.client.request(op="move", session=[created["session"]], path=[])
+        self.assertEqual(reply["message"], "Unknown session")
+        reply = await self.client.request(op="close", session={"id": 1})
+        self.assertEqual(reply["op"], "closed")
+        reply = await self.client.request(op="new", moves=1e400)
+        self.assertEqual(reply["message"], "Malformed session")
+        self.client.writer.write(b"[1, 2]\n")
+        reply = await self.client.request(op="stats")
+        self.assertEqual(reply["sessions"], 1)
+
+    async def test_large_board(self):
+        created = await self.client.request(op="new", rows=300, columns=300, target=[3, 3, 3], moves=5, seed=8)
+        self.assertEqual(len(created["board"]), 300)
+        path = [[int(row), int(col)] for row, col in Board(300, 300, 3, seed=8).find_hint()]
+        reply = await asyncio.wait_for(self.client.request(op="move", session=created["session"], path=path), 5)
+        self.assertEqual(reply["op"], "update")
+
+    async def test_backpressure(self):
+        created = await self.client.request(op="new", rows=4, columns=4, target=[3, 3, 3], moves=50, seed=8)
+        # Written in one go, before the session worker gets to run
+        lines = [json.dumps(dict(id=1000 + index, op="move", session=created["session"], path=[]))
+                 for index in range(5)]
+        futures = []
+        for index in range(5):
+            futures.append(asyncio.get_running_loop().create_future())
+            self.client.pending[1000 + index] = futures[-1]
+        self.client.writer.write(("\n".join(lines) + "\n").encode("utf-8"))
+        replies = await asyncio.gather(*futures)
+        self.assertEqual([reply["op"] for reply in replies].count("busy"), 3)
+
+    async def test_close_on_disconnect(self):
+        await self.client.request(op="new", rows=4, columns=4, target=[3, 3, 3], moves=5)
+        self.assertEqual(len(self.server.sessions), 1)
+        await self.client.close()
+        for _ in range(100):
+            if len(self.server.sessions) == 0:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(len(self.server.sessions), 0)
+        self.client = LoadClient(self.host, self.port)
+        await self.client.connect()
+
+    async def test_load(self):
+        report = await run_load_test(self.host, self.port, 20, 2, [5, 5, 5, 5], 5)
+        self.assertEqual(report["sessions"], 20)
+        self.assertTrue(20 <= report["moves"] <= 100)
+        self.assertEqual(report["server"]["count"], report["moves"] + 20 * 2 + report["busy"])
+
+
+if __name__ == '__main__':
+    unittest.main()
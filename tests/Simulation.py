@@ -0,0 +1,55 @@
+import unittest
+import numpy
+
+from src.Core import Board, is_valid_path
+from src.Game import Play
+from src.Simulation import Simulation, greedy_path_policy, short_path_policy
+
+
+class PolicyTest(unittest.TestCase):
+    def test_policies_return_valid_paths(self):
+        play = Play([10, 10, 10, 10], 10, lambda *args: None, lambda *args: None)
+        random = numpy.random.default_rng(1)
+        for _ in range(20):
+            board = Board(8, 8, 4)
+            for policy in [short_path_policy, greedy_path_policy]:
+                path = policy(board, play, random)
+                self.assertTrue(is_valid_path(board.get_board(), path))
+
+    def test_greedy_prefers_wanted_kinds(self):
+        board = Board(4, 4, 3)
+        board.board = numpy.array([[0, 0, 0, 1],
+                                   [2, 2, 1, 1],
+                                   [2, 2, 1, 1],
+                                   [0, 0, 0, 1]], numpy.int8)
+        play = Play([3, 3, 3], 10, lambda *args: None, lambda *args: None)
+        play.picked_counts = [3, 3, 0]
+        path = greedy_path_policy(board, play, numpy.random.default_rng(1))
+        self.assertTrue(all(board.board[p] == 2 for p in path))
+        self.assertEqual(len(path), 4)
+
+
+class SimulationTest(unittest.TestCase):
+    def test_run(self):
+        simulation = Simulation(8, 8, [5, 5, 5, 5, 5, 5], 20, greedy_path_policy)
+        report = simulation.run(10)
+        self.assertEqual(report.games, 10)
+        self.assertTrue(10 <= report.moves <= 10 * 20)
+        self.assertTrue(0 <= report.wins <= 10)
+        self.assertTrue(report.games_per_second > 0)
+        self.assertEqual(report.win_rate, report.wins / 10)
+
+    def test_seeded_runs_repeat(self):
+        first = Simulation(8, 8, [5, 5, 5, 5, 5, 5], 40, greedy_path_policy, seed=7).run(20)
+        second = Simulation(8, 8, [5, 5, 5, 5, 5, 5], 40, greedy_path_policy, seed=7).run(20)
+        self.assertEqual((first.moves, first.wins), (second.moves, second.wins))
+
+    def test_game_ends_when_moves_run_out(self):
+        simulation = Simulation(8, 8, [1000, 1000, 1000], 5, short_path_policy)
+        won, move_count = simulation.play_game()
+        self.assertFalse(won)
+        self.assertEqual(move_count, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+import numpy
+
+from src.Core import Board
+from src.Game import Play
+from src.Snapshot import SessionStore, from_bytes, get_snapshot_dtype, to_bytes
+
+
+def no_op(*args):
+    pass
+
+
+def make_session(seed: int) -> (Board, Play):
+    board = Board(8, 8, 6, seed=seed)
+    play = Play([10, 10, 10, 10, 10, 10], 40, no_op, no_op)
+    path = board.find_hint()
+    play.update(board.get_board_at_position(*path[0]), len(path))
+    board.update(path, compact=True)
+    return board, play
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_round_trip(self):
+        board, play = make_session(3)
+        data = to_bytes(board, play)
+        self.assertEqual(len(data), get_snapshot_dtype(8, 8, 6).itemsize)
+        loaded_board, loaded_play = from_bytes(bytearray(data), 8, 8, 6, no_op, no_op)
+        self.assertTrue(numpy.array_equal(loaded_board.get_board(), board.get_board()))
+        self.assertEqual(loaded_board.seed, 3)
+        self.assertEqual(loaded_play.target, play.target)
+        self.assertEqual(loaded_play.picked_counts, play.picked_counts)
+        self.assertEqual(loaded_play.moves, 39)
+        # The generator resumes where it stopped, so both boards go on identically
+        path = board.find_hint()
+        self.assertTrue(numpy.array_equal(board.update(path, compact=True), loaded_board.update(path, compact=True)))
+        self.assertTrue(numpy.array_equal(board.shuffle(compact=True), loaded_board.shuffle(compact=True)))
+
+    def test_loaded_board_is_a_view(self):
+        board, play = make_session(4)
+        data = bytearray(to_bytes(board, play))
+        loaded_board, _ = from_bytes(data, 8, 8, 6, no_op, no_op)
+        self.assertTrue(numpy.shares_memory(loaded_board.get_board(), numpy.frombuffer(data, numpy.int8)))
+
+    def test_stuck_board_is_restored_as_is(self):
+        stuck = numpy.array([[0, 1, 0, 0],
+                             [0, 2, 2, 1],
+                             [1, 1, 0, 1],
+                             [2, 0, 2, 2]], numpy.int8)
+        board = Board(4, 4, 3, stuck, seed=6, shuffle_if_stuck=False)
+        play = Play([10, 10, 10], 40, no_op, no_op)
+        state = board.random.bit_generator.state
+        data = bytearray(to_bytes(board, play))
+        loaded_board, _ = from_bytes(data, 4, 4, 3, no_op, no_op)
+        self.assertTrue(numpy.array_equal(loaded_board.get_board(), stuck))
+        self.assertEqual(loaded_board.random.bit_generator.state, state)
+        self.assertTrue(numpy.shares_memory(loaded_board.get_board(), numpy.frombuffer(data, numpy.int8)))
+
+
+class SessionStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, "sessions.bin")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_save_and_reopen(self):
+        store = SessionStore(self.file_path, 8, 8, 6, 1000)
+        sessions = [make_session(seed) for seed in range(3)]
+        for index, (board, play) in enumerate(sessions):
+            store.save(index * 400, board, play)
+        self.assertFalse(store.is_used(1))
+        with self.assertRaises(KeyError):
+            store.load(1, no_op, no_op)
+        store.close()
+
+        store = SessionStore(self.file_path)
+        self.assertEqual(len(store), 1000)
+        for index, (board, play) in enumerate(sessions):
+            loaded_board, loaded_play = store.load(index * 400, no_op, no_op)
+            self.assertTrue(numpy.array_equal(loaded_board.get_board(), board.get_board()))
+            self.assertEqual(loaded_play.picked_counts, play.picked_counts)
+        store.delete(400)
+        self.assertFalse(store.is_used(400))
+        store.close()
+
+    def test_updates_write_through(self):
+        store = SessionStore(self.file_path, 8, 8, 6, 10)
+        board, play = make_session(5)
+        store.save(2, board, play)
+        loaded_board, loaded_play = store.load(2, no_op, no_op)
+        path = loaded_board.find_hint()
+        loaded_play.update(loaded_board.get_board_at_position(*path[0]), len(path))
+        loaded_board.update(path, compact=True)
+        self.assertTrue(numpy.array_equal(store.records["cells"][2], loaded_board.get_board()))
+        store.save(2, loaded_board, loaded_play)
+        self.assertEqual(store.records["moves"][2], 38)
+
+    def test_rejects_other_files(self):
+        with open(self.file_path, "wb") as other_file:
+            other_file.write(bytes(64))
+        with self.assertRaises(ValueError):
+            SessionStore(self.file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()